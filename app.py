@@ -1,12 +1,522 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog, messagebox, simpledialog, colorchooser, font
+import argparse
+import json
 import os
+import queue
+from bisect import bisect_left, bisect_right
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+import zlib
+from collections import OrderedDict
 from datetime import datetime
 import string
 
+from note_core import (
+    DirectoryWatcher, FileStorage, FilenameIndex, Instrumentation, LineStats, MappedNote, NoteBase, NoteHasher, NoteIndex,
+    PackArchive,
+    ParallelGrep, SQLiteStorage, SaveQueue, TextPositions, TitleIndex, VersionStore, WriteConflict, atomic_write,
+    checked_write, copy_notes, decode_formatting, encode_formatting, export_notes, find_matches, flatten_runs,
+    import_notes,
+)
+
+# Hot-path timings and event-loop lag, off until View > Performance Monitor is checked
+instrumentation = Instrumentation()
+
+# Note files at least this big open read-only in a LargeNoteView instead of a full text widget,
+# and are listed in the search index without their words
+LARGE_NOTE_THRESHOLD = 256 * 1024 * 1024
+
+# File dialog choices for File > Export Notes / Import Notes
+BUNDLE_FILE_TYPES = [("Zip archive", "*.zip"), ("JSON Lines", "*.jsonl"), ("Markdown bundle", "*.md")]
+
+
+class VirtualListbox(tk.Frame):
+    """
+    A listbox that keeps its items in a Python list and only materializes the rows that are
+    currently visible, so it stays fast with tens of thousands of entries.
+    """
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master)
+        self.items = []
+        self.top = 0
+        self.selected = None
+
+        self.listbox = tk.Listbox(self, exportselection=False, **kwargs)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.row_height = font.Font(font=self.listbox['font']).metrics("linespace") + 1
+
+        self.listbox.bind("<<ListboxSelect>>", self.on_select)
+        self.listbox.bind("<Configure>", lambda event: self.render())
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll(-event.delta // 120 * 3))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(3))
+
+    def visible_rows(self):
+        return max(1, self.listbox.winfo_height() // self.row_height)
+
+    def render(self):
+        """Show the slice of items that fits in the listbox and update the scrollbar."""
+        rows = self.visible_rows()
+        self.top = max(0, min(self.top, len(self.items) - rows))
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *self.items[self.top:self.top + rows + 1])
+        if self.selected is not None and self.top <= self.selected <= self.top + rows:
+            self.listbox.selection_set(self.selected - self.top)
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items), min(1.0, (self.top + rows) / len(self.items)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        return "break"
+
+    def scroll(self, rows):
+        self.top += rows
+        return self.render()
+
+    def yview(self, *args):
+        """Scrollbar callback supporting the 'moveto' and 'scroll' protocols."""
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.items))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            self.top += amount * self.visible_rows() if args[2] == "pages" else amount
+        self.render()
+
+    def on_select(self, event=None):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.top + selection[0]
+
+    def set_items(self, items):
+        """Replace all items, keeping the scroll position where possible."""
+        self.items = list(items)
+        self.selected = None
+        self.render()
+
+    def insert(self, index, *items):
+        """Insert items at an index (tk.END appends), mirroring tk.Listbox.insert."""
+        if index == tk.END:
+            self.items.extend(items)
+        else:
+            self.items[index:index] = items
+            # Keep the selection on the same item
+            if self.selected is not None and index <= self.selected:
+                self.selected += len(items)
+        self.render()
+
+    def delete(self, first, last=None):
+        """Delete items between two indices inclusive (tk.END for the last item)."""
+        last = len(self.items) - 1 if last == tk.END else (first if last is None else last)
+        del self.items[first:last + 1]
+        # Keep the selection on the same item, or drop it if it was deleted
+        if self.selected is not None and first <= self.selected:
+            self.selected = None if self.selected <= last else self.selected - (last + 1 - first)
+        self.render()
+
+    def get(self, index):
+        return self.items[index]
+
+    def size(self):
+        return len(self.items)
+
+    def curselection(self):
+        return (self.selected,) if self.selected is not None and self.selected < len(self.items) else ()
+
+    def bind(self, sequence=None, func=None, add=None):
+        """Bind events on the inner listbox so callers can treat this like a tk.Listbox."""
+        return self.listbox.bind(sequence, func, add)
+
+
+class NoteLoader:
+    """
+    Reads a note from a storage in a worker thread and feeds it to a text widget in bounded
+    chunks from the Tk event loop, so the window stays responsive while large notes load.
+    """
+
+    CHUNK_SIZE = 256 * 1024  # Characters read and inserted per step
+
+    def __init__(self, root, text_widget, storage, name, on_progress, on_done):
+        self.root = root
+        self.text_widget = text_widget
+        self.storage = storage
+        self.name = name
+        self.positions = TextPositions()  # Line offsets, built while reading
+        self.base = None  # NoteBase of what was read, set before "done"
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.cancelled = threading.Event()
+        self.chunks = queue.Queue(maxsize=8)  # Bounds memory if reading outpaces the widget
+
+        self.text_widget.configure(state='disabled')
+        threading.Thread(target=self.read_worker, daemon=True).start()
+        self.root.after(1, self.feed)
+
+    def read_worker(self):
+        """
+        Background thread: read the note chunk by chunk onto the queue, hashing it on the way,
+        then decode the saved formatting, if any, so the UI thread only has to apply it.
+        """
+        try:
+            # Stat before reading: if the note changes mid-read the next save sees a conflict
+            entry = self.storage.entry(self.name)
+            total = max(1, entry.size)
+            hasher = NoteHasher()
+            with self.storage.open(self.name) as file:
+                while not self.cancelled.is_set():
+                    chunk = file.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    self.positions.extend(chunk)
+                    self.put(("chunk", chunk, self.positions.length * 100 // total))
+            data = self.storage.read_formatting(self.name)
+            self.base = NoteBase(hasher.digest(data), entry.mtime, entry.size)
+            self.put(("done", self.decode_formatting(data), 100))
+        except Exception as e:
+            self.put(("error", e, 0))
+
+    def decode_formatting(self, data):
+        """Return the saved formatting runs, or None if there are none or they no longer fit the text."""
+        try:
+            if not data:
+                return None
+            runs, length = decode_formatting(data)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable formatting for {self.name}: {e}")
+            return None
+        # The note was changed by something that did not update the formatting
+        return runs if length == self.positions.length else None
+
+    def put(self, item):
+        """Put an item on the queue, giving up if the load is cancelled while waiting for space."""
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def feed(self):
+        """Insert at most one chunk into the widget, then yield back to the event loop."""
+        if self.cancelled.is_set():
+            return
+        try:
+            kind, payload, percent = self.chunks.get_nowait()
+        except queue.Empty:
+            self.root.after(10, self.feed)
+            return
+
+        if kind == "chunk":
+            self.text_widget.configure(state='normal')
+            self.text_widget.insert(tk.END, payload)
+            self.text_widget.configure(state='disabled')
+            self.on_progress(min(99, percent))
+            self.root.after(1, self.feed)
+        elif kind == "done":
+            self.text_widget.configure(state='normal')
+            self.text_widget.edit_reset()
+            self.text_widget.edit_modified(False)
+            self.on_done("done", payload)
+        else:
+            self.text_widget.configure(state='normal')
+            self.on_done("error", payload)
+
+    def cancel(self):
+        """Stop reading; the caller decides what to do with the partially loaded widget."""
+        self.cancelled.set()
+        self.on_done("cancelled", None)
+
+
+class LargeNoteView:
+    """
+    Read-only view of a MappedNote in a text widget: only the lines that fit on screen are
+    ever inserted, scrolling re-reads them from the mapped file, and the scrollbar tracks the
+    byte position. The line index is built in the background; until it is done, jumping to a
+    line works only up to the indexed part, but scrolling and searching work right away.
+    """
+
+    MAX_LINE_LENGTH = 10000  # Longer lines are shown cut short
+    PROGRESS_BYTES = 64 * 1024 * 1024  # Status refresh interval while indexing
+
+    def __init__(self, text_widget, scrollbar, note, call_on_ui, on_change, on_message):
+        self.text_widget = text_widget
+        self.scrollbar = scrollbar
+        self.note = note
+        self.call_on_ui = call_on_ui
+        self.on_change = on_change
+        self.on_message = on_message
+        self.top = 0  # Offset of the first visible line
+        self.bottom = 0  # Offset just past the last visible line
+        self.match = None  # (start, end) offsets of the current search match
+        self.search_generation = 0  # Bumped by every search so stale results are dropped
+
+        text_widget.configure(wrap='none', undo=False, state='disabled', yscrollcommand="")
+        text_widget.tag_configure("search_current", background="orange")
+        scrollbar.configure(command=self.yview)
+        xscrollbar = tk.Scrollbar(text_widget.master, orient=tk.HORIZONTAL, command=text_widget.xview)
+        xscrollbar.pack(side=tk.BOTTOM, fill=tk.X, before=text_widget)
+        text_widget.configure(xscrollcommand=xscrollbar.set)
+        # The tab's named base font, so a font size change is picked up on the next render
+        self.font = font.nametofont(text_widget.cget("font"))
+
+        text_widget.bind("<Configure>", lambda event: self.render())
+        text_widget.bind("<Destroy>", lambda event: self.note.close(), add="+")
+        text_widget.bind("<MouseWheel>", lambda event: self.scroll(-event.delta // 120 * 3))
+        text_widget.bind("<Button-4>", lambda event: self.scroll(-3))
+        text_widget.bind("<Button-5>", lambda event: self.scroll(3))
+        text_widget.bind("<Up>", lambda event: self.scroll(-1))
+        text_widget.bind("<Down>", lambda event: self.scroll(1))
+        text_widget.bind("<Prior>", lambda event: self.scroll(-self.visible_rows()))
+        text_widget.bind("<Next>", lambda event: self.scroll(self.visible_rows()))
+        text_widget.bind("<Control-Home>", lambda event: self.yview("moveto", 0))
+        text_widget.bind("<Control-End>", lambda event: self.yview("moveto", 1))
+
+        threading.Thread(target=self.index_worker, daemon=True).start()
+
+    def index_worker(self):
+        reported = [0]
+
+        def progress(indexed_bytes):
+            if indexed_bytes - reported[0] >= self.PROGRESS_BYTES:
+                reported[0] = indexed_bytes
+                self.call_on_ui(self.on_change)
+
+        if self.note.build_index(progress):
+            self.call_on_ui(self.on_change)
+
+    def visible_rows(self):
+        return max(1, self.text_widget.winfo_height() // self.font.metrics("linespace"))
+
+    def render(self):
+        """Fill the widget with the lines from self.top down and update the scrollbar."""
+        if not self.text_widget.winfo_exists():
+            return "break"
+        rows = self.visible_rows()
+        lines, self.bottom = self.note.read_lines(self.top, rows, self.MAX_LINE_LENGTH)
+        if len(lines) < rows and self.top > 0:
+            # Past the end: show the last full screen instead
+            self.top = self.note.previous_lines(self.note.size, rows - 1)
+            lines, self.bottom = self.note.read_lines(self.top, rows, self.MAX_LINE_LENGTH)
+        self.text_widget.configure(state='normal')
+        self.text_widget.delete("1.0", tk.END)
+        self.text_widget.insert("1.0", "\n".join(lines))
+        if self.match and self.match[0] < self.bottom and self.match[1] > self.top:
+            self.text_widget.tag_add("search_current", self.index_of(max(self.match[0], self.top)),
+                                     self.index_of(min(self.match[1], self.bottom)))
+        self.text_widget.configure(state='disabled')
+        self.text_widget.edit_modified(False)
+        size = max(1, self.note.size)
+        self.scrollbar.set(self.top / size, self.bottom / size)
+        return "break"
+
+    def index_of(self, offset):
+        """Text index of a byte offset inside the rendered window."""
+        line_start = self.note.line_start(offset)
+        row = self.note.count_newlines(self.top, line_start) + 1
+        column = len(self.note.map[line_start:offset].decode("utf-8", "replace"))
+        return f"{row}.{column}"
+
+    def scroll(self, rows):
+        if rows > 0:
+            self.top = self.note.next_lines(self.top, rows)
+        else:
+            self.top = self.note.previous_lines(self.top, -rows)
+        return self.render()
+
+    def yview(self, *args):
+        """Scrollbar callback supporting the 'moveto' and 'scroll' protocols."""
+        if args[0] == "moveto":
+            self.top = self.note.line_start(min(self.note.size, int(float(args[1]) * self.note.size)))
+            return self.render()
+        amount = int(args[1])
+        return self.scroll(amount * self.visible_rows() if args[2] == "pages" else amount)
+
+    def go_to_line(self, number):
+        """Scroll so 1-based line number is at the top. Returns False if it is not indexed yet."""
+        offset = self.note.line_offset(max(0, number - 1))
+        if offset is None:
+            return False
+        self.top = offset
+        self.render()
+        return True
+
+    def status(self):
+        """Line position and index progress for the status bar."""
+        line = self.note.line_number(self.top)
+        position = f"Line: {line + 1}" if line is not None else "Line: ?"
+        if self.note.line_count is None:
+            percent = self.note.indexed_bytes * 100 // max(1, self.note.size)
+            return f"{position} | Indexing lines: {percent}%"
+        return f"{position} of {self.note.line_count}"
+
+    def find(self, term, use_regex=False, backwards=False):
+        """Search the mapped file in the background from the current match (or view) onwards, wrapping around."""
+        try:
+            regex = re.compile(term.encode('utf-8') if use_regex else re.escape(term.encode('utf-8')),
+                               re.IGNORECASE | re.MULTILINE)
+        except re.error as e:
+            messagebox.showerror("Search", f"Invalid regular expression: {e}")
+            return
+        if self.match:
+            start = self.match[0] if backwards else self.match[1]
+        else:
+            start = self.top
+        self.search_generation += 1
+        generation = self.search_generation
+        self.on_message(f"Searching for '{term}'...")
+
+        def run():
+            try:
+                span = self.note.search(regex, start, backwards)
+                if span is None:
+                    span = self.note.search(regex, self.note.size if backwards else 0, backwards)
+            except ValueError:
+                return  # Closed while searching
+            self.call_on_ui(self.show_match, generation, term, span)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def show_match(self, generation, term, span):
+        if generation != self.search_generation or not self.text_widget.winfo_exists():
+            return
+        self.match = span
+        if span is None:
+            self.render()
+            self.on_message(f"No matches for '{term}'")
+            return
+        if not self.top <= span[0] < self.bottom:
+            # Leave a few lines of context above the match
+            self.top = self.note.previous_lines(span[0], self.visible_rows() // 3)
+        self.render()
+        line = self.note.line_number(span[0])
+        self.on_message(f"Match for '{term}' at line {line + 1}" if line is not None else f"Match for '{term}'")
+
+
+class StyleEngine:
+    """
+    Interns text styles (weight, slant, underline and color on top of the base font) into
+    shared named fonts and one text tag per distinct combination. Every tab renders with the
+    same base font and style fonts, so a family or size change is one configure per font,
+    and a note has at most one style tag per character however heavily it is formatted.
+    """
+
+    TAG_PREFIX = "style:"
+    PLAIN = (False, False, False, "")
+
+    def __init__(self, root, family, size):
+        self.root = root
+        self.base_font = font.Font(root, family=family, size=size)
+        self.fonts = {}
+        self.tag_styles = {}
+
+    @staticmethod
+    def style_key(style):
+        """Reduce a saved style dict to a hashable (bold, italic, underline, color) key."""
+        return (style.get("weight") == "bold", style.get("slant") == "italic",
+                bool(style.get("underline")), style.get("color") or "")
+
+    @staticmethod
+    def style_dict(key):
+        """The saved form of a style key, listing only the attributes that are set."""
+        bold, italic, underline, color = key
+        style = {}
+        if bold:
+            style["weight"] = "bold"
+        if italic:
+            style["slant"] = "italic"
+        if underline:
+            style["underline"] = True
+        if color:
+            style["color"] = color
+        return style
+
+    def font_for(self, bold, italic, underline):
+        """The shared named font for a weight/slant/underline combination."""
+        if not (bold or italic or underline):
+            return self.base_font
+        named_font = self.fonts.get((bold, italic, underline))
+        if named_font is None:
+            named_font = self.fonts[(bold, italic, underline)] = font.Font(
+                self.root, family=self.base_font.cget("family"), size=self.base_font.cget("size"),
+                weight="bold" if bold else "normal", slant="italic" if italic else "roman", underline=underline)
+        return named_font
+
+    def tag_for(self, text_widget, key):
+        """Name of the tag rendering a style key (None for plain text), configured on first use."""
+        if key == self.PLAIN:
+            return None
+        bold, italic, underline, color = key
+        tag = f"{self.TAG_PREFIX}{'b' if bold else ''}{'i' if italic else ''}{'u' if underline else ''}:{color}"
+        self.tag_styles[tag] = key
+        if tag not in text_widget.style_tags:
+            options = {"font": self.font_for(bold, italic, underline)}
+            if color:
+                options["foreground"] = color
+            text_widget.tag_configure(tag, **options)
+            text_widget.style_tags.add(tag)
+        return tag
+
+    def set_base_font(self, family, size):
+        """Change the family and size of every tab's text, styled or not."""
+        self.base_font.configure(family=family, size=size)
+        for named_font in self.fonts.values():
+            named_font.configure(family=family, size=size)
+
+    def segments(self, text_widget, first, last):
+        """Split first..last into (start, end, style key) runs at the style tag boundaries."""
+        active = [tag for tag in text_widget.tag_names(first) if tag in text_widget.style_tags]
+        segments = []
+        start = first
+        for kind, tag, index in text_widget.dump(first, last, tag=True):
+            if tag not in text_widget.style_tags:
+                continue
+            if text_widget.compare(index, ">", start):
+                segments.append((start, index, self.tag_styles[active[-1]] if active else self.PLAIN))
+                start = index
+            if kind == "tagon":
+                if tag not in active:
+                    active.append(tag)
+            elif tag in active:
+                active.remove(tag)
+        segments.append((start, last, self.tag_styles[active[-1]] if active else self.PLAIN))
+        return segments
+
+    def restyle(self, text_widget, first, last, change):
+        """Replace the style of every segment in first..last with change(style key)."""
+        removals = {}
+        additions = {}
+        for start, end, key in self.segments(text_widget, first, last):
+            new_key = change(key)
+            if new_key == key:
+                continue
+            old_tag = self.tag_for(text_widget, key)
+            if old_tag:
+                removals.setdefault(old_tag, []).extend((start, end))
+            new_tag = self.tag_for(text_widget, new_key)
+            if new_tag:
+                additions.setdefault(new_tag, []).extend((start, end))
+        for tag, indices in removals.items():
+            for position in range(0, len(indices), 2):
+                text_widget.tag_remove(tag, indices[position], indices[position + 1])
+        for tag, indices in additions.items():
+            text_widget.tag_add(tag, *indices)
+
+
 class EnhancedNoteApp:
-    def __init__(self, root):
+    def __init__(self, root, storage_backend="files", startup_report=False):
+        # Startup milestones, reported once the sidebar has finished listing notes
+        self.startup_started = time.perf_counter()
+        self.startup_marks = []
+        self.startup_report = startup_report
+
         self.root = root
         self.root.title("Enhanced Note-Taking App by DevKay")
         self.root.geometry("1000x700")
@@ -15,19 +525,108 @@ class EnhancedNoteApp:
         self.notes_directory = os.path.join(os.path.dirname(__file__), "Notes")
         self.ensure_notes_directory()
 
+        # Directory for app data (search index etc.), kept next to the notes directory
+        self.data_directory = os.path.join(os.path.dirname(__file__), ".notes_data")
+        self.ensure_data_directory()
+        self.large_note_threshold = LARGE_NOTE_THRESHOLD
+
+        # Where notes are read from and written to; the search index is refreshed after startup
+        self.storage = self.create_storage(storage_backend)
+        self.search_results = []
+        # Running "All notes" regex scan, if any; Esc cancels it
+        self.grep = None
+        self.max_grep_results = 5000
+
+        # Known note filenames for O(1) duplicate checks, seeded by the sidebar scan
+        self.filename_index = FilenameIndex(self.storage)
+        # Fuzzy matcher behind the Ctrl+P palette, rebuilt in the background after each sidebar scan
+        self.title_index = TitleIndex()
+        self.title_index_generation = 0  # Bumped by each sidebar scan; only its own build is installed
+        self.quick_open_window = None
+
+        # Watches the notes folder once it has been listed and applies changes made by other programs
+        self.watcher = None
+        self.changed_on_disk_icon = None
+
+        # Callbacks posted by worker threads, run on the Tk thread
+        self.ui_queue = queue.Queue()
+        self.root.after(50, self.process_ui_queue)
+
+        # Delta-compressed history of every saved version of each note
+        self.version_store = VersionStore(os.path.join(self.data_directory, "versions"))
+        # Recording rebuilds the previous version and diffs against it, so it gets its own
+        # worker instead of holding up the save workers; back-to-back saves of a note coalesce
+        self.version_queue = SaveQueue(write=self.version_store.record, workers=1)
+
+        # Background writer for saves and autosave
+        # Several workers so Save All writes notes concurrently; a single path is never written twice at once
+        self.save_queue = SaveQueue(
+            write=instrumentation.timed("write note (worker)")(self.write_queued_note),
+            workers=4)
+        # (storage, name) -> (base a save was queued with, base it left on disk), so a save
+        # queued before the previous one finished checks against what that one wrote
+        self.written_bases = {}
+        self.autosave_var = tk.BooleanVar(value=False)
+        self.autosave_interval_ms = 60 * 1000
+        # Save All batch started by the exit prompt, checked for failures before the window closes
+        self.pending_save_batch = None
+        self.root.after(self.autosave_interval_ms, self.autosave)
+
         # Initialize filename as None
         self.filename = None
 
-        # Initialize font settings
+        # Pending after() id for coalesced status bar refreshes
+        self.status_update_job = None
+
+        # Performance monitor: heartbeat sampling event-loop lag while instrumentation is on
+        self.instrument_var = tk.BooleanVar(value=False)
+        self.heartbeat_interval_ms = 100
+        self.heartbeat_job = None
+        self.performance_window = None
+
+        # Initialize font settings; the family list is only enumerated when the dropdown opens
         self.current_font_family = "Arial"
         self.current_font_size = 12
-
-        # Create the main UI components
+        self.style_engine = StyleEngine(self.root, self.current_font_family, self.current_font_size)
+        self.font_families = None
+        self.font_cache_path = os.path.join(self.data_directory, "font_families.json")
+
+        # Tabs with a live text widget, least recently used first; inactive, unmodified tabs are
+        # unloaded once their combined size passes the budget (in characters)
+        self.loaded_tabs = OrderedDict()
+        self.tab_memory_budget = 32 * 1024 * 1024
+        self.max_undo = 1000
+        self.session_path = os.path.join(self.data_directory, "session.json")
+
+        # Create the UI needed for the first keystroke; the sidebar follows once the window is shown
+        self.sidebar = None
         self.create_menu()
         self.create_toolbar()
-        self.create_sidebar()
         self.create_tabs()
         self.create_status_bar()
+        self.mark_startup("window built")
+        self.root.after_idle(self.finish_startup)
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
+
+    def finish_startup(self):
+        """Second startup stage, run after the first paint: sidebar, note listing and search index."""
+        self.mark_startup("first paint")
+        self.create_sidebar()
+        self.mark_startup("sidebar built")
+        threading.Thread(target=self.storage.refresh_index, daemon=True).start()
+
+    def mark_startup(self, label):
+        """Record a startup milestone relative to the start of __init__."""
+        self.startup_marks.append((label, (time.perf_counter() - self.startup_started) * 1000))
+
+    def report_startup(self):
+        """Show the startup timings in the status bar and, if requested, print them."""
+        self.status_var.set(f"Ready in {self.startup_marks[1][1]:.0f} ms "
+                            f"({len(self.note_entries)} notes listed in {self.startup_marks[-1][1]:.0f} ms)")
+        if self.startup_report:
+            print("Startup timings:")
+            for label, elapsed_ms in self.startup_marks:
+                print(f"  {label:<16} {elapsed_ms:8.1f} ms")
 
     def ensure_notes_directory(self):
         """Ensure that the notes directory exists; create it if it doesn't."""
@@ -38,6 +637,26 @@ class EnhancedNoteApp:
             except Exception as e:
                 messagebox.showerror("Error", f"Could not create notes directory: {e}")
 
+    def create_storage(self, backend):
+        """Create the note storage for the given backend name ("files" or "sqlite")."""
+        if backend == "sqlite":
+            return SQLiteStorage(os.path.join(self.data_directory, "notes.sqlite3"))
+        index = NoteIndex(os.path.join(self.data_directory, "index.sqlite3"), self.large_note_threshold)
+        try:
+            archive = PackArchive(os.path.join(self.data_directory, "notes.pack"))
+        except (OSError, ValueError) as e:
+            print(f"Could not open the note archive: {e}")
+            archive = None
+        return FileStorage(self.notes_directory, index, archive)
+
+    def ensure_data_directory(self):
+        """Ensure that the app data directory exists; create it if it doesn't."""
+        if not os.path.exists(self.data_directory):
+            try:
+                os.makedirs(self.data_directory)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not create data directory: {e}")
+
     def create_menu(self):
         """Create the menu bar with File, Edit, View, and Help menus."""
         menu_bar = tk.Menu(self.root)
@@ -49,8 +668,21 @@ class EnhancedNoteApp:
 
         file_menu.add_command(label="New", accelerator="Ctrl+N", command=self.new_file)
         file_menu.add_command(label="Open", accelerator="Ctrl+O", command=self.open_file)
+        file_menu.add_command(label="Quick Open...", accelerator="Ctrl+P", command=self.show_quick_open)
         file_menu.add_command(label="Save", accelerator="Ctrl+S", command=self.save_file)
         file_menu.add_command(label="Save As", accelerator="Ctrl+Shift+S", command=self.save_as)
+        file_menu.add_command(label="Save All", accelerator="Ctrl+Alt+S", command=self.save_all)
+        file_menu.add_command(label="Reload From Disk", command=self.reload_from_disk)
+        file_menu.add_checkbutton(label="Autosave", variable=self.autosave_var)
+        file_menu.add_separator()
+        file_menu.add_command(label="Version History...", command=self.show_history)
+        file_menu.add_command(label="Clean Up History...", command=self.clean_up_history)
+        file_menu.add_command(label="Archive Old Notes...", command=self.archive_old_notes)
+        file_menu.add_command(label="Compact Archive", command=self.compact_archive)
+        file_menu.add_command(label="Export Notes...", command=self.export_all_notes)
+        file_menu.add_command(label="Import Notes...", command=self.import_all_notes)
+        file_menu.add_separator()
+        file_menu.add_command(label="Cancel Loading", accelerator="Esc", command=self.cancel_loading)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", accelerator="Ctrl+Q", command=self.exit_app)
 
@@ -66,6 +698,7 @@ class EnhancedNoteApp:
         edit_menu.add_command(label="Paste", accelerator="Ctrl+V", command=lambda: self.current_text_widget.event_generate("<<Paste>>"))
         edit_menu.add_separator()
         edit_menu.add_command(label="Select All", accelerator="Ctrl+A", command=lambda: self.current_text_widget.tag_add("sel", "1.0", "end"))
+        edit_menu.add_command(label="Go to Line...", accelerator="Ctrl+G", command=self.go_to_line)
 
         # View Menu
         view_menu = tk.Menu(menu_bar, tearoff=0)
@@ -74,6 +707,10 @@ class EnhancedNoteApp:
         view_menu.add_command(label="Toggle Sidebar", command=self.toggle_sidebar)
         view_menu.add_command(label="Toggle Toolbar", command=self.toggle_toolbar)
         view_menu.add_command(label="Toggle Status Bar", command=self.toggle_status_bar)
+        view_menu.add_separator()
+        view_menu.add_checkbutton(label="Performance Monitor", variable=self.instrument_var,
+                                  command=self.toggle_instrumentation)
+        view_menu.add_command(label="Performance Panel...", command=self.show_performance_panel)
 
         # Help Menu
         help_menu = tk.Menu(menu_bar, tearoff=0)
@@ -134,14 +771,15 @@ class EnhancedNoteApp:
         sep2 = ttk.Separator(toolbar, orient='vertical')
         sep2.pack(side=tk.LEFT, fill='y', padx=5)
 
-        # Font Family Dropdown
-        font_families = list(font.families())
+        # Font Family Dropdown (filled on first open, see load_font_families)
         self.font_family_var = tk.StringVar()
         self.font_family_var.set(self.current_font_family)
-        font_family_menu = ttk.Combobox(toolbar, textvariable=self.font_family_var, values=font_families, state='readonly')
-        font_family_menu.bind("<<ComboboxSelected>>", self.change_font_family)
-        font_family_menu.pack(side=tk.LEFT, padx=5)
-        font_family_menu.set(self.current_font_family)
+        self.font_family_menu = ttk.Combobox(toolbar, textvariable=self.font_family_var, state='readonly',
+                                             values=self.font_families or [self.current_font_family],
+                                             postcommand=self.load_font_families)
+        self.font_family_menu.bind("<<ComboboxSelected>>", self.change_font_family)
+        self.font_family_menu.pack(side=tk.LEFT, padx=5)
+        self.font_family_menu.set(self.current_font_family)
 
         # Font Size Dropdown
         font_sizes = list(range(8, 73, 2))
@@ -163,11 +801,37 @@ class EnhancedNoteApp:
         bg_color_btn.image = bg_color_icon
         bg_color_btn.pack(side=tk.LEFT, padx=2, pady=2)
 
+    def load_font_families(self):
+        """
+        Fill the font family dropdown the first time it is opened. A cached list on disk is used
+        when available and refreshed once the dropdown is showing.
+        """
+        if self.font_families is None:
+            try:
+                with open(self.font_cache_path, "r", encoding='utf-8') as file:
+                    self.font_families = json.load(file)
+                self.root.after_idle(self.refresh_font_cache)
+            except (OSError, ValueError):
+                self.refresh_font_cache()
+        self.font_family_menu.configure(values=self.font_families)
+
+    def refresh_font_cache(self):
+        """Enumerate the installed font families and update the dropdown and disk cache if they changed."""
+        families = sorted(set(font.families()))
+        if families == self.font_families:
+            return
+        self.font_families = families
+        self.font_family_menu.configure(values=families)
+        try:
+            atomic_write(self.font_cache_path, json.dumps(families))
+        except OSError as e:
+            print(f"Could not cache font list: {e}")
+
     def create_sidebar(self):
         """Create a sidebar listing existing notes."""
         self.sidebar_visible = True
         self.sidebar = tk.Frame(self.root, bd=1, relief=tk.SUNKEN, width=200)
-        self.sidebar.pack(side=tk.LEFT, fill=tk.Y)
+        self.sidebar.pack(side=tk.LEFT, fill=tk.Y, before=self.notebook)
 
         # Search Entry
         search_frame = tk.Frame(self.sidebar)
@@ -184,8 +848,51 @@ class EnhancedNoteApp:
         search_btn = tk.Button(search_frame, text="Go", command=self.search_notes)
         search_btn.pack(side=tk.LEFT, padx=2)
 
+        search_all_btn = tk.Button(search_frame, text="All", command=self.search_all_notes)
+        search_all_btn.pack(side=tk.LEFT, padx=2)
+
+        # Search options and match navigation
+        search_options_frame = tk.Frame(self.sidebar)
+        search_options_frame.pack(padx=5, fill=tk.X)
+
+        self.regex_var = tk.BooleanVar(value=False)
+        regex_check = tk.Checkbutton(search_options_frame, text="Regex", variable=self.regex_var)
+        regex_check.pack(side=tk.LEFT)
+
+        # Scan every note file instead of the current note (Go / Enter)
+        self.grep_var = tk.BooleanVar(value=False)
+        grep_check = tk.Checkbutton(search_options_frame, text="All notes", variable=self.grep_var)
+        grep_check.pack(side=tk.LEFT)
+
+        next_btn = tk.Button(search_options_frame, text=">", command=self.next_match)
+        next_btn.pack(side=tk.RIGHT, padx=2)
+
+        prev_btn = tk.Button(search_options_frame, text="<", command=self.previous_match)
+        prev_btn.pack(side=tk.RIGHT, padx=2)
+
+        # Cross-note search results
+        results_label = tk.Label(self.sidebar, text="Results:", anchor=tk.W)
+        results_label.pack(padx=5, fill=tk.X)
+
+        self.results_listbox = tk.Listbox(self.sidebar, height=8)
+        self.results_listbox.pack(padx=5, pady=(0, 5), fill=tk.X)
+        self.results_listbox.bind("<Double-Button-1>", self.open_search_result)
+
+        # Sort order for the notes list
+        sort_frame = tk.Frame(self.sidebar)
+        sort_frame.pack(padx=5, fill=tk.X)
+
+        sort_label = tk.Label(sort_frame, text="Sort by:")
+        sort_label.pack(side=tk.LEFT)
+
+        self.sort_var = tk.StringVar(value="Name")
+        sort_menu = ttk.Combobox(sort_frame, textvariable=self.sort_var, values=["Name", "Modified", "Size"],
+                                 state='readonly', width=10)
+        sort_menu.bind("<<ComboboxSelected>>", lambda event: self.sort_notes_listbox())
+        sort_menu.pack(side=tk.LEFT, padx=5)
+
         # Notes Listbox
-        self.notes_listbox = tk.Listbox(self.sidebar)
+        self.notes_listbox = VirtualListbox(self.sidebar)
         self.notes_listbox.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
         self.notes_listbox.bind("<Double-Button-1>", self.open_selected_note)
 
@@ -195,9 +902,11 @@ class EnhancedNoteApp:
         """Create a tabbed interface for multiple notes."""
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
-        # Initialize first tab
-        self.add_new_tab()
+        # Reopen the last session's notes, or start with an empty tab
+        if not self.restore_session():
+            self.add_new_tab()
 
     def create_status_bar(self):
         """Create a status bar at the bottom of the application."""
@@ -207,23 +916,116 @@ class EnhancedNoteApp:
         self.status_bar = tk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
-    def add_new_tab(self, title="Untitled"):
-        """Add a new tab with a text widget."""
+    def add_new_tab(self, title="Untitled", storage=None, select=True):
+        """
+        Add a new tab. Tabs for stored notes start as a lightweight placeholder and only build
+        their text widget (and load the note) when they are first selected.
+        Returns the tab frame.
+        """
         tab = ttk.Frame(self.notebook)
+        tab.text_widget = None
+        tab.storage = storage
+        tab.view_state = None  # (yview fraction, insert index) kept while the tab is unloaded
+        tab.base = None  # NoteBase of the note as last loaded or saved by us
+        tab.changed_on_disk = None  # Set by the directory watcher: "changed", "deleted" or "renamed"
         self.notebook.add(tab, text=title)
-        self.notebook.select(tab)
-
+        if storage is None:
+            self.build_text_area(tab)
+        else:
+            self.show_placeholder(tab)
+        if select:
+            self.notebook.select(tab)
+        return tab
+
+    def show_placeholder(self, tab):
+        """Show the stand-in for a tab whose text widget is not loaded."""
+        placeholder = tk.Label(tab, text="Select this tab to load the note.", fg="gray")
+        placeholder.pack(expand=True)
+
+    def build_text_area(self, tab, wrap='word'):
+        """Create the text widget and scrollbar of a tab. Returns the text widget."""
         # Create Text Widget with Scrollbar in the tab
-        text_area = tk.Text(tab, undo=True, wrap='word', font=(self.current_font_family, self.current_font_size))
+        text_area = tk.Text(tab, undo=True, maxundo=self.max_undo, wrap=wrap, font=self.style_engine.base_font)
         text_area.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         scrollbar = tk.Scrollbar(tab, command=text_area.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         text_area.config(yscrollcommand=scrollbar.set)
+        text_area.scrollbar = scrollbar
+        text_area.focus_set()
+
+        # Keep word/char/line counts up to date as the text is edited
+        self.track_edits(text_area)
 
-        # Bind events to update status bar (e.g., word count)
-        text_area.bind("<KeyRelease>", self.update_status_bar)
+        # Set while a NoteLoader is filling the widget
+        text_area.loader = None
+
+        # Set for read-only large notes, whose widget only ever holds the visible lines
+        text_area.large_view = None
+
+        # Style tags configured on this widget (see StyleEngine.tag_for)
+        text_area.style_tags = set()
+
+        # Offsets of the last search's matches; cleared on edit since they go stale
+        text_area.search_matches = None
+        text_area.search_positions = None
+        text_area.search_current = -1
+
+        tab.text_widget = text_area
+        self.loaded_tabs[str(tab)] = tab
+        return text_area
+
+    def track_edits(self, text_area):
+        """
+        Route the text widget's insert/delete/replace commands through a proxy so the cached
+        line statistics are recounted only for the lines an edit touched.
+        """
+        text_area.line_stats = LineStats()
+        widget_command = text_area._w
+        original_command = widget_command + "_orig"
+        text_area.tk.call("rename", widget_command, original_command)
+
+        def call(*args):
+            return text_area.tk.call((original_command,) + args)
+
+        def line_of(index):
+            return int(str(call("index", index)).split(".")[0])
+
+        def proxy(operation, *args):
+            if operation == "edit" and args and args[0] in ("undo", "redo"):
+                result = call(operation, *args)
+                text_area.line_stats.reset(call("get", "1.0", "end-1c"))
+                self.schedule_status_update()
+                return result
+            if operation not in ("insert", "delete", "replace") or str(call("cget", "-state")) == "disabled":
+                return call(operation, *args)
+
+            # The final newline can never be edited, so clamp line numbers to the last real line
+            last_line = line_of("end-1c")
+            first = min(line_of(args[0]), last_line)
+            if operation == "insert":
+                last = first
+                inserted = "".join(args[1::2])
+            elif operation == "delete":
+                last = min(line_of(args[1] if len(args) > 1 else f"{args[0]}+1c"), last_line)
+                inserted = ""
+            else:
+                last = min(line_of(args[1]), last_line)
+                inserted = "".join(args[2::2])
+            last = max(last, first)
+
+            result = call(operation, *args)
+
+            new_last = first + inserted.count("\n")
+            lines = str(call("get", f"{first}.0", f"{new_last}.end")).split("\n")
+            text_area.line_stats.replace_lines(first - 1, last - first + 1, lines)
+            text_area.search_matches = None
+            self.schedule_status_update()
+            return result
+
+        text_area.tk.createcommand(widget_command, proxy)
+        text_area.bind("<Destroy>", lambda event: text_area.tk.deletecommand(widget_command), add="+")
 
     def get_current_tab(self):
         """Get the current tab and its text widget."""
@@ -231,8 +1033,157 @@ class EnhancedNoteApp:
         if not current_tab:
             return None, None
         tab = self.notebook.nametowidget(current_tab)
-        text_widget = tab.winfo_children()[0]
-        return tab, text_widget
+        if tab.text_widget is None:
+            self.materialize_tab(tab)
+        return tab, tab.text_widget
+
+    def on_tab_changed(self, event=None):
+        """Load the newly selected tab if needed and mark it as most recently used."""
+        current_tab = self.notebook.select()
+        if not current_tab:
+            return
+        tab = self.notebook.nametowidget(current_tab)
+        if tab.text_widget is None:
+            self.materialize_tab(tab)
+        else:
+            self.loaded_tabs.move_to_end(str(tab))
+            self.update_status_bar()
+        self.enforce_tab_budget()
+
+    def materialize_tab(self, tab, on_loaded=None):
+        """Replace a tab's placeholder with a text widget and load its note in the background."""
+        for child in tab.winfo_children():
+            child.destroy()
+        filename = self.notebook.tab(tab, "text")
+        if self.is_large_note(tab.storage, filename):
+            self.open_large_note(tab, filename, on_loaded)
+            return
+        text_widget = self.build_text_area(tab)
+
+        def on_progress(percent):
+            self.status_var.set(f"Loading {filename}: {percent}% (Esc to cancel)")
+
+        def on_done(outcome, payload):
+            loader = text_widget.loader
+            text_widget.loader = None
+            if outcome == "done":
+                if payload:
+                    self.apply_formatting(text_widget, payload, loader.positions)
+                tab.base = loader.base
+                self.set_changed_on_disk(tab, None)
+                if tab.view_state:
+                    yview, insert = tab.view_state
+                    text_widget.mark_set(tk.INSERT, insert)
+                    text_widget.yview_moveto(yview)
+                self.update_status_bar()
+                self.enforce_tab_budget()
+                if on_loaded:
+                    on_loaded()
+            else:
+                self.close_tab(tab)
+                if outcome == "error":
+                    messagebox.showerror("Error", f"Could not open file: {payload}")
+                else:
+                    self.status_var.set(f"Loading {filename} cancelled")
+
+        text_widget.loader = NoteLoader(self.root, text_widget, tab.storage, filename, on_progress, on_done)
+
+    def is_large_note(self, storage, filename):
+        """Whether a note is a plain file big enough to be opened in a LargeNoteView."""
+        if not isinstance(storage, FileStorage):
+            return False
+        try:
+            return os.path.getsize(storage.path(filename)) >= self.large_note_threshold
+        except OSError:
+            return False  # Archived or missing; the normal loader reports errors
+
+    def open_large_note(self, tab, filename, on_loaded=None):
+        """Show a large note read-only through a memory map, one screenful at a time."""
+        try:
+            note = MappedNote(tab.storage.path(filename))
+        except (OSError, ValueError) as e:
+            self.close_tab(tab)
+            messagebox.showerror("Error", f"Could not open file: {e}")
+            return
+        text_widget = self.build_text_area(tab, wrap='none')
+        view = text_widget.large_view = LargeNoteView(
+            text_widget, text_widget.scrollbar, note, self.call_on_ui, self.schedule_status_update, self.status_var.set)
+        # No content hash: large notes are never saved, the watcher only compares mtime and size
+        stat = os.fstat(note.file.fileno())
+        tab.base = NoteBase(None, stat.st_mtime, stat.st_size)
+        self.set_changed_on_disk(tab, None)
+        view.yview("moveto", tab.view_state[0] if tab.view_state else 0.0)
+        if on_loaded:
+            on_loaded()
+
+    def view_state(self, text_widget):
+        """(yview fraction, insert index) of a text widget, as kept for unloaded tabs and sessions."""
+        if text_widget.large_view:
+            return (text_widget.large_view.top / max(1, text_widget.large_view.note.size), "1.0")
+        return (text_widget.yview()[0], text_widget.index(tk.INSERT))
+
+    def unload_tab(self, tab):
+        """Drop a tab's text widget, remembering its scroll and cursor position."""
+        text_widget = tab.text_widget
+        tab.view_state = self.view_state(text_widget)
+        tab.text_widget = None
+        self.loaded_tabs.pop(str(tab), None)
+        for child in tab.winfo_children():
+            child.destroy()
+        self.show_placeholder(tab)
+
+    def enforce_tab_budget(self):
+        """Unload the least recently used inactive, unmodified tabs until loaded text fits the budget."""
+        current_tab = self.notebook.select()
+        total = sum(tab.text_widget.line_stats.char_count for tab in self.loaded_tabs.values())
+        for name, tab in list(self.loaded_tabs.items()):
+            if total <= self.tab_memory_budget:
+                break
+            text_widget = tab.text_widget
+            if name == current_tab or tab.storage is None or text_widget.loader or text_widget.edit_modified():
+                continue
+            total -= text_widget.line_stats.char_count
+            self.unload_tab(tab)
+
+    def restore_session(self):
+        """
+        Recreate the tabs open at the end of the last session as placeholders; only the selected
+        one is loaded. Returns True if any tab was restored.
+        """
+        try:
+            with open(self.session_path, "r", encoding='utf-8') as file:
+                session = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        selected = None
+        for entry in session.get("tabs", []):
+            tab = self.add_new_tab(title=entry["name"], storage=self.storage, select=False)
+            tab.view_state = (entry.get("yview", 0.0), entry.get("insert", "1.0"))
+            if entry["name"] == session.get("selected") or selected is None:
+                selected = tab
+        if selected is None:
+            return False
+        self.notebook.select(selected)
+        return True
+
+    def save_session(self):
+        """Remember which stored notes are open, and where, for the next start."""
+        tabs = []
+        for tab_id in self.notebook.tabs():
+            tab = self.notebook.nametowidget(tab_id)
+            if tab.storage is not self.storage:
+                continue  # Untitled notes and files opened from elsewhere are not restored
+            view_state = tab.view_state or (0.0, "1.0")
+            if tab.text_widget is not None:
+                view_state = self.view_state(tab.text_widget)
+            tabs.append({"name": self.notebook.tab(tab_id, "text"), "yview": view_state[0], "insert": view_state[1]})
+        current_tab = self.notebook.select()
+        session = {"tabs": tabs, "selected": self.notebook.tab(current_tab, "text") if current_tab else None}
+        try:
+            atomic_write(self.session_path, json.dumps(session))
+        except OSError as e:
+            print(f"Could not save session: {e}")
 
     def bind_shortcuts(self):
         """Bind keyboard shortcuts to respective functions."""
@@ -240,15 +1191,23 @@ class EnhancedNoteApp:
         self.root.bind("<Control-N>", lambda event: self.new_file())
         self.root.bind("<Control-o>", lambda event: self.open_file())
         self.root.bind("<Control-O>", lambda event: self.open_file())
+        self.root.bind("<Control-p>", lambda event: self.show_quick_open())
+        self.root.bind("<Control-P>", lambda event: self.show_quick_open())
         self.root.bind("<Control-s>", lambda event: self.save_file())
         self.root.bind("<Control-S>", lambda event: self.save_file())
         self.root.bind("<Control-Shift-S>", lambda event: self.save_as())
+        self.root.bind("<Control-Alt-s>", lambda event: self.save_all())
         self.root.bind("<Control-q>", lambda event: self.exit_app())
         self.root.bind("<Control-Q>", lambda event: self.exit_app())
         self.root.bind("<Control-a>", lambda event: self.select_all())
         self.root.bind("<Control-A>", lambda event: self.select_all())
         self.root.bind("<Control-f>", lambda event: self.search_notes())
         self.root.bind("<Control-F>", lambda event: self.search_notes())
+        self.root.bind("<Escape>", lambda event: self.cancel_loading())
+        self.root.bind("<F3>", lambda event: self.next_match())
+        self.root.bind("<Shift-F3>", lambda event: self.previous_match())
+        self.root.bind("<Control-g>", lambda event: self.go_to_line())
+        self.root.bind("<Control-G>", lambda event: self.go_to_line())
 
     def new_file(self):
         """Create a new note in a new tab."""
@@ -263,28 +1222,55 @@ class EnhancedNoteApp:
             filetypes=[("Text Documents", "*.txt"), ("All Files", "*.*")]
         )
         if file_path:
-            try:
-                with open(file_path, "r", encoding='utf-8') as file:
-                    content = file.read()
-                filename = os.path.basename(file_path)
-                if self.is_duplicate_filename(filename):
-                    messagebox.showwarning("Duplicate Filename",
-                                           f"A file named '{filename}' is already open in a tab.")
-                    return
-                self.add_new_tab(title=filename)
-                tab, text_widget = self.get_current_tab()
-                text_widget.insert(tk.END, content)
-                text_widget.edit_modified(False)
-                self.update_status_bar()
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not open file: {e}")
+            filename = os.path.basename(file_path)
+            if self.is_duplicate_filename(filename):
+                messagebox.showwarning("Duplicate Filename",
+                                       f"A file named '{filename}' is already open in a tab.")
+                return
+            self.load_into_new_tab(FileStorage(os.path.dirname(file_path)), filename)
 
+    def load_into_new_tab(self, storage, filename, on_loaded=None):
+        """
+        Open a note from a storage in a new tab, loading it in the background.
+        Returns True if loading started, False otherwise.
+        """
+        try:
+            storage.size(filename)  # Fail before creating the tab if the note is missing
+            tab = self.add_new_tab(title=filename, storage=storage)
+            self.materialize_tab(tab, on_loaded)
+            return True
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open file: {e}")
+            return False
+
+    def cancel_loading(self):
+        """Cancel a running all-notes search, or else the load running in the current tab."""
+        if self.grep is not None:
+            self.grep.cancel()
+            return
+        tab, text_widget = self.get_current_tab()
+        if text_widget and text_widget.loader:
+            text_widget.loader.cancel()
+
+    def close_tab(self, tab):
+        """Remove a tab and destroy its widgets."""
+        self.loaded_tabs.pop(str(tab), None)
+        self.notebook.forget(tab)
+        tab.destroy()
+
+    @instrumentation.timed("save_file")
     def save_file(self):
         """Save the current note. If it's a new note, invoke Save As."""
         tab, text_widget = self.get_current_tab()
         if not text_widget:
             return
-        content = text_widget.get(1.0, tk.END).strip()
+        if text_widget.loader:
+            messagebox.showwarning("Loading", "Please wait until the note has finished loading.")
+            return
+        if text_widget.large_view:
+            messagebox.showinfo("Read-Only", "Large notes are opened read-only and cannot be saved from here.")
+            return
+        content, formatting = self.snapshot_note(text_widget)
         if not content:
             messagebox.showwarning("Empty Content", "Cannot save an empty note.")
             return
@@ -293,21 +1279,20 @@ class EnhancedNoteApp:
         if filename == "Untitled":
             self.save_as()
         else:
-            file_path = os.path.join(self.notes_directory, filename)
-            try:
-                with open(file_path, "w", encoding='utf-8') as file:
-                    file.write(content)
-                messagebox.showinfo("Saved", f"File '{filename}' saved successfully.")
-                self.status_var.set(f"Saved: {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not save file: {e}")
+            self.write_note(text_widget, filename, content, formatting)
 
     def save_as(self):
         """Save the current note with a new name based on timestamp and title."""
         tab, text_widget = self.get_current_tab()
         if not text_widget:
             return
-        content = text_widget.get(1.0, tk.END).strip()
+        if text_widget.loader:
+            messagebox.showwarning("Loading", "Please wait until the note has finished loading.")
+            return
+        if text_widget.large_view:
+            messagebox.showinfo("Read-Only", "Large notes are opened read-only and cannot be saved from here.")
+            return
+        content, formatting = self.snapshot_note(text_widget)
         if not content:
             messagebox.showwarning("Empty Content", "Cannot save an empty note.")
             return
@@ -333,17 +1318,432 @@ class EnhancedNoteApp:
                                    f"A file named '{filename}' already exists. Please choose a different title.")
             return
 
-        # Full path
-        file_path = os.path.join(self.notes_directory, filename)
+        # Reserve the name right away so a second Save As cannot pick it before the write lands
+        self.filename_index.reserve(filename)
 
-        try:
-            with open(file_path, "w", encoding='utf-8') as file:
-                file.write(content)
+        def on_saved(filename, error):
+            if error:
+                messagebox.showerror("Error", f"Could not save file: {error}")
+                return
+            if not tab.winfo_exists():
+                return
+            # Only now is the note a file in our storage: from here on the tab is titled with
+            # it and can be unloaded and restored like any other stored note
             self.notebook.tab(tab, text=filename)
+            tab.storage = self.storage
+            tab.base = None
+            self.set_changed_on_disk(tab, None)
             messagebox.showinfo("Saved", f"File '{filename}' saved successfully.")
             self.status_var.set(f"Saved: {filename}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not save file: {e}")
+
+        # A new file: nothing on disk to conflict with
+        self.write_note(text_widget, filename, content, formatting, on_saved=on_saved, force=True,
+                        storage=self.storage)
+
+    def snapshot_note(self, text_widget):
+        """
+        Return the note's content as it will be saved (stripped) and its formatting encoded
+        against that content, or None if it has no formatting.
+        """
+        raw = text_widget.get("1.0", "end-1c")
+        content = raw.strip()
+        lead = len(raw) - len(raw.lstrip())
+        positions = TextPositions(raw)
+
+        runs = []
+        for tag in text_widget.style_tags:
+            ranges = text_widget.tag_ranges(tag)
+            style = self.style_engine.style_dict(self.style_engine.tag_styles[tag])
+            for first, last in zip(ranges[0::2], ranges[1::2]):
+                start = min(max(positions.offset(first) - lead, 0), len(content))
+                end = min(max(positions.offset(last) - lead, 0), len(content))
+                if end > start:
+                    runs.append((style, start, end))
+
+        formatting = encode_formatting(runs, len(content)) if runs else None
+        return content, formatting
+
+    def apply_formatting(self, text_widget, runs, positions, batch_size=10000):
+        """
+        Apply saved formatting runs in bulk, with one tag_add call per style tag and batch.
+        Overlapping runs from older saves are merged first, one style tag per character.
+        """
+        ranges = {}
+        for style, start, end in flatten_runs(runs):
+            tag = self.style_engine.tag_for(text_widget, self.style_engine.style_key(style))
+            if tag:
+                ranges.setdefault(tag, []).extend((positions.index(start), positions.index(end)))
+        for tag, indices in ranges.items():
+            for first in range(0, len(indices), batch_size * 2):
+                text_widget.tag_add(tag, *indices[first:first + batch_size * 2])
+
+    def write_note(self, text_widget, filename, content, formatting=None, notify=True, on_saved=None, force=False,
+                   storage=None):
+        """
+        Queue a snapshot of a note's content and formatting for writing in the background.
+        With notify=False (autosave) the outcome is only reported in the status bar; with
+        on_saved the caller gets on_saved(filename, error) on the UI thread and reports it.
+        The worker hashes the snapshot and skips the write if it matches what is on disk, and
+        refuses it if the note changed on disk since it was loaded, unless force is set.
+        Notes opened from elsewhere are written back where they came from, unless storage is given.
+        """
+        if text_widget.large_view:
+            # The widget holds only the visible window of a large note; saving it would truncate the file
+            error = PermissionError(f"'{filename}' is open read-only as a large note")
+            if on_saved is not None:
+                self.call_on_ui(on_saved, filename, error)
+            else:
+                self.status_var.set(f"Could not save {filename}: large notes are read-only")
+            return
+        text_widget.edit_modified(False)
+        if on_saved is None:
+            self.status_var.set(f"Saving {filename}...")
+        tab = text_widget.master
+        base = None if force else tab.base
+        storage = storage or tab.storage or self.storage
+
+        def on_done(job, error):
+            # Runs on a save worker thread. A Save As reservation is dropped whatever the outcome;
+            # on success the written name is in the index by now
+            self.filename_index.release(filename)
+            if error is None and job.result[1]:
+                self.version_queue.enqueue(filename, job.content[0], self.on_version_recorded)
+            self.call_on_ui(self.on_note_saved, text_widget, filename, error, notify, on_saved, job.result)
+
+        # Keyed by storage as well: a note opened from another folder may share a name with one of ours
+        self.save_queue.enqueue((storage, filename), (content, formatting, base), on_done)
+
+    def on_version_recorded(self, job, error):
+        # Runs on the version worker thread
+        if error is not None:
+            print(f"Could not record version of {job.path}: {error}")
+
+    def write_queued_note(self, key, note):
+        """Save worker: write a note, keeping the filename index current without masking other changes."""
+        storage, name = key
+        content, formatting, base = note
+        # Writes to one note never overlap, so nothing else touches this entry meanwhile
+        queued_base = base
+        written = self.written_bases.get(key)
+        if base is not None and written is not None and written[0] == base:
+            base = written[1]
+        token_before = self.storage.change_token() if storage is self.storage else None
+        result = checked_write(storage, name, content, formatting, base)
+        self.written_bases[key] = (queued_base, result[0])
+        if result[1] and storage is self.storage:
+            self.filename_index.add(name, token_before)
+        return result
+
+    def on_note_saved(self, text_widget, filename, error, notify, on_saved=None, result=None):
+        """Report the outcome of a background save; result is (NoteBase, whether it was written)."""
+        if error and text_widget.winfo_exists():
+            text_widget.edit_modified(True)
+            if isinstance(error, WriteConflict):
+                self.set_changed_on_disk(text_widget.master, "changed")
+                if on_saved is None and notify:
+                    self.resolve_write_conflict(text_widget, filename)
+                    return
+        elif not error:
+            tab = self.find_tab(filename)
+            if tab is None or tab.storage in (None, self.storage):
+                self.title_index.add(filename)
+            if tab is not None:
+                # Remember what is on disk so the next save can skip or check it, and so the
+                # directory watcher does not flag our own save
+                tab.base = result[0]
+                self.set_changed_on_disk(tab, None)
+        if on_saved is not None:
+            on_saved(filename, error)
+            return
+        if error:
+            if notify:
+                messagebox.showerror("Error", f"Could not save file: {error}")
+            else:
+                self.status_var.set(f"Could not save {filename}: {error}")
+            return
+        if not result[1]:
+            self.status_var.set(f"No changes to save in {filename}")
+            return
+        if notify:
+            messagebox.showinfo("Saved", f"File '{filename}' saved successfully.")
+        self.status_var.set(f"Saved: {filename}")
+
+    def resolve_write_conflict(self, text_widget, filename):
+        """Ask what to do about a save refused because the note changed on disk."""
+        answer = messagebox.askyesnocancel(
+            "Changed On Disk",
+            f"'{filename}' was changed by another program since you opened it.\n\n"
+            "Yes: overwrite it with your version\n"
+            "No: discard your changes and reload it from disk\n"
+            "Cancel: keep editing without saving")
+        tab = text_widget.master
+        if answer:
+            content, formatting = self.snapshot_note(text_widget)
+            self.write_note(text_widget, filename, content, formatting, force=True)
+        elif answer is False:
+            tab.storage = tab.storage or self.storage
+            self.unload_tab(tab)
+            self.materialize_tab(tab)
+        else:
+            self.status_var.set(f"Not saved: {filename} was changed on disk")
+
+    def save_all(self):
+        """
+        Snapshot every modified named tab once and queue the writes together; the save workers
+        run them concurrently and a single summary lands in the status bar. Untitled tabs are
+        skipped (they need Save As). Returns the batch dict so callers can wait for the outcome.
+        """
+        notes = []
+        untitled = 0
+        for tab_id in self.notebook.tabs():
+            text_widget = self.notebook.nametowidget(tab_id).text_widget
+            if not text_widget or text_widget.loader or not text_widget.edit_modified():
+                continue
+            filename = self.notebook.tab(tab_id, "text")
+            if filename == "Untitled":
+                untitled += 1
+                continue
+            content, formatting = self.snapshot_note(text_widget)
+            if content:
+                notes.append((text_widget, filename, content, formatting))
+
+        batch = {"pending": len(notes), "saved": [], "failed": [], "untitled": untitled}
+        if not notes:
+            self.status_var.set(self.save_all_summary(batch))
+            return batch
+
+        def on_saved(filename, error):
+            if error:
+                batch["failed"].append((filename, error))
+            else:
+                batch["saved"].append(filename)
+            batch["pending"] -= 1
+            if not batch["pending"]:
+                self.status_var.set(self.save_all_summary(batch))
+
+        self.status_var.set(f"Saving {len(notes)} notes...")
+        for text_widget, filename, content, formatting in notes:
+            self.write_note(text_widget, filename, content, formatting, notify=False, on_saved=on_saved)
+        return batch
+
+    def save_all_summary(self, batch):
+        """Describe a finished Save All batch in one line."""
+        parts = [f"Saved {len(batch['saved'])} note{'s' if len(batch['saved']) != 1 else ''}"]
+        if batch["failed"]:
+            parts.append(f"{len(batch['failed'])} failed ({', '.join(name for name, _ in batch['failed'])})")
+        if batch["untitled"]:
+            parts.append(f"{batch['untitled']} untitled need Save As")
+        return ", ".join(parts)
+
+    def autosave(self):
+        """Periodically queue writes for modified tabs that already have a filename."""
+        if self.autosave_var.get():
+            for tab_id in self.notebook.tabs():
+                filename = self.notebook.tab(tab_id, "text")
+                text_widget = self.notebook.nametowidget(tab_id).text_widget
+                if filename == "Untitled" or not text_widget or text_widget.loader or not text_widget.edit_modified():
+                    continue
+                content, formatting = self.snapshot_note(text_widget)
+                if content:
+                    self.write_note(text_widget, filename, content, formatting, notify=False)
+        self.root.after(self.autosave_interval_ms, self.autosave)
+
+    def archive_old_notes(self):
+        """Pack notes not modified for a number of days into the archive, in the background."""
+        if getattr(self.storage, "archive", None) is None:
+            messagebox.showinfo("Archive", "Archiving is only available with the file storage.")
+            return
+        days = simpledialog.askinteger("Archive Old Notes", "Archive notes not modified for how many days?",
+                                       initialvalue=180, minvalue=1)
+        if not days:
+            return
+        # Open notes stay as files so saving them never races the archiver
+        open_notes = [self.notebook.tab(tab_id, "text") for tab_id in self.notebook.tabs()]
+        older_than = time.time() - days * 24 * 60 * 60
+        self.status_var.set("Archiving old notes...")
+
+        def run():
+            try:
+                message = f"Archived {self.storage.archive_notes(older_than, exclude=open_notes)} notes"
+            except (OSError, ValueError) as e:
+                message = f"Could not archive notes: {e}"
+            self.call_on_ui(self.on_notes_changed, message)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def compact_archive(self):
+        """Rewrite the archive without replaced and removed notes, in the background."""
+        if getattr(self.storage, "archive", None) is None:
+            messagebox.showinfo("Archive", "Archiving is only available with the file storage.")
+            return
+        self.status_var.set("Compacting archive...")
+
+        def run():
+            try:
+                message = f"Archive compacted, {self.storage.archive.compact() / 1024:.0f} KB reclaimed"
+            except OSError as e:
+                message = f"Could not compact the archive: {e}"
+            self.call_on_ui(self.on_notes_changed, message)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def export_all_notes(self):
+        """Stream every stored note into a JSONL, Markdown or zip bundle, in the background."""
+        path = filedialog.asksaveasfilename(title="Export Notes", defaultextension=".zip",
+                                            filetypes=BUNDLE_FILE_TYPES)
+        if not path:
+            return
+        self.status_var.set("Exporting notes...")
+
+        def progress(count):
+            if count % 500 == 0:
+                self.call_on_ui(self.status_var.set, f"Exported {count} notes...")
+
+        def run():
+            try:
+                message = f"Exported {export_notes(self.storage, path, progress)} notes to {os.path.basename(path)}"
+            except (OSError, ValueError, sqlite3.Error) as e:
+                message = f"Could not export notes: {e}"
+            self.call_on_ui(self.status_var.set, message)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def import_all_notes(self):
+        """Stream the notes of a JSONL, Markdown or zip bundle into the storage, in the background."""
+        path = filedialog.askopenfilename(title="Import Notes", filetypes=BUNDLE_FILE_TYPES)
+        if not path:
+            return
+        if not messagebox.askyesno("Import Notes",
+                                   "Notes in the bundle replace existing notes with the same name. Continue?"):
+            return
+        self.status_var.set("Importing notes...")
+
+        def progress(count):
+            if count % 500 == 0:
+                self.call_on_ui(self.status_var.set, f"Imported {count} notes...")
+
+        def run():
+            try:
+                count, skipped = import_notes(self.storage, path, progress)
+                message = f"Imported {count} notes from {os.path.basename(path)}"
+                if skipped:
+                    message += f" ({skipped} skipped: not a plain .txt name)"
+            except (OSError, ValueError, sqlite3.Error, zipfile.BadZipFile) as e:
+                message = f"Could not import notes: {e}"
+            self.call_on_ui(self.on_notes_changed, message)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def on_notes_changed(self, message):
+        """Report a bulk operation on the notes and relist them."""
+        self.status_var.set(message)
+        if self.sidebar is not None:
+            self.populate_notes_listbox()
+
+    def call_on_ui(self, func, *args):
+        """Schedule func(*args) on the Tk thread; safe to call from worker threads."""
+        self.ui_queue.put((func, args))
+
+    def run_ui_calls(self):
+        """Run every callback that worker threads have posted so far."""
+        while True:
+            try:
+                func, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                return
+            func(*args)
+
+    def process_ui_queue(self):
+        self.run_ui_calls()
+        self.root.after(50, self.process_ui_queue)
+
+    def show_history(self):
+        """Browse the saved versions of the current note and restore one into its tab."""
+        tab, text_widget = self.get_current_tab()
+        if not text_widget:
+            return
+        filename = self.notebook.tab(tab, "text")
+        versions = self.version_store.list_versions(filename) if filename != "Untitled" else []
+        if not versions:
+            messagebox.showinfo("Version History", f"No saved versions of '{filename}' yet.")
+            return
+        versions.reverse()  # Newest first
+
+        window = tk.Toplevel(self.root)
+        window.title(f"Version History: {filename}")
+        window.geometry("800x500")
+
+        button_frame = tk.Frame(window)
+        button_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+
+        version_listbox = tk.Listbox(window, width=40, exportselection=False)
+        version_listbox.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
+        for version in versions:
+            saved_at = datetime.fromtimestamp(version.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+            version_listbox.insert(tk.END, f"#{version.number + 1}  {saved_at}  ({version.kind}, {version.stored_size} B)")
+
+        preview = tk.Text(window, wrap='word', state='disabled')
+        preview.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        def selected_content():
+            """The selected version's content, or None if nothing is selected or it cannot be read."""
+            selection = version_listbox.curselection()
+            if not selection:
+                return None
+            try:
+                return self.version_store.get(filename, versions[selection[0]].number)
+            except (OSError, zlib.error, ValueError) as e:
+                messagebox.showerror("Version History", f"Could not read this version: {e}", parent=window)
+                return None
+
+        def show_version(event=None):
+            content = selected_content()
+            if content is None:
+                return
+            preview.configure(state='normal')
+            preview.delete("1.0", tk.END)
+            preview.insert("1.0", content)
+            preview.configure(state='disabled')
+
+        def restore_version():
+            if not version_listbox.curselection():
+                messagebox.showwarning("Version History", "Please select a version to restore.", parent=window)
+                return
+            content = selected_content()
+            if content is None:
+                return
+            if not text_widget.winfo_exists() or text_widget.loader:
+                messagebox.showwarning("Version History", "The note's tab is not ready.", parent=window)
+                return
+            text_widget.delete("1.0", tk.END)
+            text_widget.insert("1.0", content)
+            text_widget.edit_modified(True)
+            self.status_var.set(f"Restored an earlier version of {filename} (not saved yet)")
+            window.destroy()
+
+        version_listbox.bind("<<ListboxSelect>>", show_version)
+        tk.Button(button_frame, text="Close", command=window.destroy).pack(side=tk.RIGHT, padx=2)
+        tk.Button(button_frame, text="Restore", command=restore_version).pack(side=tk.RIGHT, padx=2)
+
+        version_listbox.selection_set(0)
+        show_version()
+
+    def clean_up_history(self):
+        """Prune every note's version history down to a number of recent versions, in the background."""
+        keep = simpledialog.askinteger("Clean Up History", "Keep how many versions per note?",
+                                       initialvalue=50, minvalue=1)
+        if not keep:
+            return
+        self.status_var.set("Cleaning up version history...")
+
+        def worker():
+            try:
+                removed = self.version_store.collect_garbage(keep=keep)
+                self.call_on_ui(self.status_var.set, f"Removed {removed} old versions")
+            except Exception as e:
+                self.call_on_ui(messagebox.showerror, "Error", f"Could not clean up history: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
 
     def sanitize_filename(self, name):
         """Remove or replace characters that are invalid in filenames."""
@@ -356,18 +1756,17 @@ class EnhancedNoteApp:
         Check if a file with the same name (case-insensitive) already exists in the notes directory.
         Returns True if a duplicate exists, False otherwise.
         """
-        existing_files = os.listdir(self.notes_directory)
-        # Normalize existing filenames to lower case for case-insensitive comparison
-        existing_files_lower = [f.lower() for f in existing_files]
-        return filename.lower() in existing_files_lower
+        return filename in self.filename_index
 
     def toggle_sidebar(self):
         """Toggle the visibility of the sidebar."""
+        if self.sidebar is None:
+            return  # Still starting up
         if self.sidebar_visible:
             self.sidebar.pack_forget()
             self.sidebar_visible = False
         else:
-            self.sidebar.pack(side=tk.LEFT, fill=tk.Y)
+            self.sidebar.pack(side=tk.LEFT, fill=tk.Y, before=self.notebook)
             self.sidebar_visible = True
 
     def toggle_toolbar(self):
@@ -395,6 +1794,72 @@ class EnhancedNoteApp:
         """Display the About dialog."""
         messagebox.showinfo("About", "Enhanced Note-Taking App\nDeveloped By DevKay")
 
+    def toggle_instrumentation(self):
+        """Turn hot-path timing and event-loop lag sampling on or off."""
+        instrumentation.enabled = self.instrument_var.get()
+        if instrumentation.enabled and self.heartbeat_job is None:
+            self.heartbeat_job = self.root.after(self.heartbeat_interval_ms, self.heartbeat, time.perf_counter())
+        self.status_var.set(f"Performance monitor {'on' if instrumentation.enabled else 'off'}")
+
+    def heartbeat(self, scheduled_at):
+        """Record how much later than requested this after() callback ran, i.e. event-loop lag."""
+        lag = time.perf_counter() - scheduled_at - self.heartbeat_interval_ms / 1000
+        instrumentation.record("event loop lag", max(lag, 0.0))
+        if instrumentation.enabled:
+            self.heartbeat_job = self.root.after(self.heartbeat_interval_ms, self.heartbeat, time.perf_counter())
+        else:
+            self.heartbeat_job = None
+
+    def show_performance_panel(self):
+        """Live table of the recorded timings, refreshed every second, with export and reset."""
+        if self.performance_window is not None and self.performance_window.winfo_exists():
+            self.performance_window.lift()
+            return
+        window = self.performance_window = tk.Toplevel(self.root)
+        window.title("Performance")
+        window.geometry("760x320")
+
+        button_frame = tk.Frame(window)
+        button_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+        columns = Instrumentation.COLUMNS
+        table = ttk.Treeview(window, columns=columns, show="headings")
+        for column in columns:
+            table.heading(column, text=column)
+            table.column(column, width=220 if column == "operation" else 70, anchor=tk.W if column == "operation" else tk.E)
+        table.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            table.delete(*table.get_children())
+            for row in instrumentation.snapshot():
+                table.insert("", tk.END, values=[row["operation"], row["count"]] +
+                             [f"{row[column]:.2f}" for column in columns[2:]])
+            window.after(1000, refresh)
+
+        def export():
+            path = filedialog.asksaveasfilename(
+                parent=window, defaultextension=".json",
+                filetypes=[("JSON", "*.json"), ("CSV", "*.csv")]
+            )
+            if path:
+                try:
+                    instrumentation.export(path)
+                    self.status_var.set(f"Performance data exported to {os.path.basename(path)}")
+                except OSError as e:
+                    messagebox.showerror("Error", f"Could not export performance data: {e}", parent=window)
+
+        def reset():
+            instrumentation.reset()
+            table.delete(*table.get_children())
+
+        tk.Button(button_frame, text="Export...", command=export).pack(side=tk.LEFT)
+        tk.Button(button_frame, text="Reset", command=reset).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Close", command=window.destroy).pack(side=tk.RIGHT)
+        if not instrumentation.enabled:
+            self.status_var.set("Performance monitor is off; enable it from the View menu to record timings")
+        refresh()
+
     def make_bold(self):
         """Toggle bold formatting."""
         self.toggle_text_style("bold")
@@ -408,27 +1873,25 @@ class EnhancedNoteApp:
         self.toggle_text_style("underline")
 
     def toggle_text_style(self, style):
-        """Toggle a text style (bold, italic, underline) in the current text widget."""
+        """
+        Toggle a text style (bold, italic, underline) on the selection: if every part of it
+        already has the style it is removed, otherwise it is added, keeping the other attributes.
+        """
         tab, text_widget = self.get_current_tab()
-        if not text_widget:
+        if not text_widget or text_widget.large_view or not text_widget.tag_ranges("sel"):
             return
+        attribute = ["bold", "italic", "underline"].index(style)
+        first, last = text_widget.index("sel.first"), text_widget.index("sel.last")
+        turn_on = not all(key[attribute] for start, end, key in self.style_engine.segments(text_widget, first, last))
 
-        current_tags = text_widget.tag_names("sel.first")
-        if style in current_tags:
-            text_widget.tag_remove(style, "sel.first", "sel.last")
-        else:
-            text_widget.tag_add(style, "sel.first", "sel.last")
-
-        # Configure the tag if not already configured
-        if not text_widget.tag_cget(style, "font"):
-            current_font = font.Font(font=text_widget['font'])
-            if style == "bold":
-                current_font.configure(weight="bold")
-            elif style == "italic":
-                current_font.configure(slant="italic")
-            elif style == "underline":
-                current_font.configure(underline=True)
-            text_widget.tag_configure(style, font=current_font)
+        def change(key):
+            key = list(key)
+            key[attribute] = turn_on
+            return tuple(key)
+
+        self.style_engine.restyle(text_widget, first, last, change)
+        # Tag changes do not set the modified flag, but formatting is saved with the note
+        text_widget.edit_modified(True)
 
     def change_font_family(self, event=None):
         """Change the font family of the current text widget."""
@@ -440,29 +1903,25 @@ class EnhancedNoteApp:
         self.current_font_size = self.font_size_var.get()
         self.apply_font_changes()
 
+    @instrumentation.timed("apply_font_changes")
     def apply_font_changes(self):
-        """Apply font family and size changes to the current text widget."""
-        tab, text_widget = self.get_current_tab()
-        if not text_widget:
-            return
-        text_widget.configure(font=(self.current_font_family, self.current_font_size))
-        # Update all tags to use the new font
-        for tag in text_widget.tag_names():
-            if tag in ["bold", "italic", "underline"]:
-                self.toggle_text_style(tag)
+        """Apply font family and size changes to every tab, styled text included."""
+        self.style_engine.set_base_font(self.current_font_family, self.current_font_size)
 
     def change_text_color(self):
         """Change the color of the selected text."""
         color = colorchooser.askcolor(title="Choose text color")
         if color[1]:
             tab, text_widget = self.get_current_tab()
-            if not text_widget:
+            if not text_widget or text_widget.large_view:
                 return
-            try:
-                text_widget.tag_add("colored", "sel.first", "sel.last")
-                text_widget.tag_configure("colored", foreground=color[1])
-            except tk.TclError:
+            if not text_widget.tag_ranges("sel"):
                 messagebox.showwarning("Selection Error", "Please select text to change its color.")
+                return
+            # Each color gets its own tag, so earlier colored spans keep their color
+            self.style_engine.restyle(text_widget, text_widget.index("sel.first"), text_widget.index("sel.last"),
+                                      lambda key: key[:3] + (color[1],))
+            text_widget.edit_modified(True)
 
     def change_bg_color(self):
         """Change the background color of the text widget."""
@@ -480,8 +1939,34 @@ class EnhancedNoteApp:
             return
         text_widget.tag_add("sel", "1.0", "end")
 
-    def search_notes(self, event=None):
-        """Search for text within the current note."""
+    def go_to_line(self):
+        """Ask for a line number and move the current note there."""
+        tab, text_widget = self.get_current_tab()
+        if not text_widget or text_widget.loader:
+            return
+        number = simpledialog.askinteger("Go to Line", "Line number:", minvalue=1)
+        if not number:
+            return
+        if text_widget.large_view:
+            if not text_widget.large_view.go_to_line(number):
+                self.status_var.set(f"Line {number} has not been indexed yet")
+            return
+        text_widget.mark_set(tk.INSERT, f"{number}.0")
+        text_widget.see(tk.INSERT)
+        text_widget.focus_set()
+
+    @instrumentation.timed("search_notes")
+    def search_notes(self, event=None, in_note=False):
+        """
+        Search for text within the current note in a single pass over the buffer, highlight the
+        visible matches immediately and the rest in batches, and jump to the first match.
+        With "All notes" checked (and in_note False) every note file is scanned instead.
+        """
+        if self.sidebar is None:
+            return  # Ctrl+F during startup, before the search box exists
+        if self.grep_var.get() and not in_note:
+            self.grep_all_notes()
+            return
         tab, text_widget = self.get_current_tab()
         if not text_widget:
             return
@@ -489,70 +1974,545 @@ class EnhancedNoteApp:
         if not search_term:
             messagebox.showwarning("Input Required", "Please enter a search term.")
             return
+        if text_widget.large_view:
+            # Searched on the mapped file, one match at a time
+            text_widget.large_view.match = None
+            text_widget.large_view.find(search_term, use_regex=self.regex_var.get())
+            return
 
         # Remove previous search highlights
         text_widget.tag_remove("search", "1.0", tk.END)
+        text_widget.tag_remove("search_current", "1.0", tk.END)
 
-        # Find all occurrences of the search term
-        idx = "1.0"
-        while True:
-            idx = text_widget.search(search_term, idx, nocase=1, stopindex=tk.END)
-            if not idx:
-                break
-            end_idx = f"{idx}+{len(search_term)}c"
-            text_widget.tag_add("search", idx, end_idx)
-            idx = end_idx
-
-        # Configure the search tag
+        # Configure the search tags
         text_widget.tag_configure("search", background="yellow")
+        text_widget.tag_configure("search_current", background="orange")
+        text_widget.tag_raise("search_current", "search")
 
-        if not text_widget.tag_ranges("search"):
+        content = text_widget.get("1.0", "end-1c")
+        try:
+            matches = find_matches(content, search_term, use_regex=self.regex_var.get())
+        except re.error as e:
+            messagebox.showerror("Search", f"Invalid regular expression: {e}")
+            return
+
+        text_widget.search_matches = matches
+        text_widget.search_positions = TextPositions(content)
+        text_widget.search_current = -1
+
+        if not matches:
+            self.status_var.set(f"No matches for '{search_term}'")
             messagebox.showinfo("Search", f"No matches found for '{search_term}'.")
+            return
+
+        # Highlight the visible viewport first, then the rest lazily
+        positions = text_widget.search_positions
+        starts = [start for start, end in matches]
+        view_first = positions.offset(text_widget.index("@0,0"))
+        view_last = positions.offset(text_widget.index(f"@0,{text_widget.winfo_height()} lineend"))
+        first = bisect_left(starts, view_first)
+        last = bisect_right(starts, view_last)
+        self.highlight_matches(text_widget, matches, first, last)
+        pending = [(0, first), (last, len(matches))]
+        self.root.after(1, self.highlight_remaining_matches, text_widget, matches, pending)
+
+        # Jump to the first match at or after the cursor
+        cursor = positions.offset(text_widget.index(tk.INSERT))
+        self.select_match(text_widget, bisect_left(starts, cursor) % len(matches))
+
+    def highlight_matches(self, text_widget, matches, first, last):
+        """Tag matches[first:last] with a single tag_add call."""
+        if first >= last:
+            return
+        positions = text_widget.search_positions
+        indices = []
+        for start, end in matches[first:last]:
+            indices.append(positions.index(start))
+            indices.append(positions.index(end))
+        text_widget.tag_add("search", *indices)
+
+    def highlight_remaining_matches(self, text_widget, matches, pending, batch_size=5000):
+        """Tag the next batch of off-screen matches, then yield to the event loop."""
+        if not text_widget.winfo_exists() or text_widget.search_matches is not matches:
+            return  # The buffer was edited or searched again
+        while pending and pending[0][0] >= pending[0][1]:
+            pending.pop(0)
+        if not pending:
+            return
+        first, last = pending[0]
+        batch_end = min(last, first + batch_size)
+        self.highlight_matches(text_widget, matches, first, batch_end)
+        pending[0] = (batch_end, last)
+        self.root.after(1, self.highlight_remaining_matches, text_widget, matches, pending)
+
+    def select_match(self, text_widget, number):
+        """Make match `number` the current one, scroll to it and report the match counter."""
+        matches = text_widget.search_matches
+        positions = text_widget.search_positions
+        start, end = positions.index(matches[number][0]), positions.index(matches[number][1])
+        text_widget.tag_remove("search_current", "1.0", tk.END)
+        text_widget.tag_add("search_current", start, end)
+        text_widget.mark_set(tk.INSERT, start)
+        text_widget.see(start)
+        text_widget.search_current = number
+        self.status_var.set(f"Match {number + 1} of {len(matches)}")
+
+    def next_match(self):
+        """Move to the next search match, searching first if the results are stale."""
+        self.step_match(1)
+
+    def previous_match(self):
+        """Move to the previous search match, searching first if the results are stale."""
+        self.step_match(-1)
+
+    def step_match(self, step):
+        if self.sidebar is None:
+            return
+        tab, text_widget = self.get_current_tab()
+        if not text_widget:
+            return
+        if text_widget.large_view and self.search_var.get():
+            text_widget.large_view.find(self.search_var.get(), use_regex=self.regex_var.get(), backwards=step < 0)
+            return
+        if not text_widget.search_matches:
+            self.search_notes(in_note=True)
+            return
+        number = (text_widget.search_current + step) % len(text_widget.search_matches)
+        self.select_match(text_widget, number)
 
     def populate_notes_listbox(self):
-        """Populate the sidebar listbox with existing notes."""
+        """Scan the notes directory in the background and stream its notes into the sidebar."""
+        self.note_entries = []
         self.notes_listbox.delete(0, tk.END)
-        for file in os.listdir(self.notes_directory):
-            if file.lower().endswith(".txt"):
-                self.notes_listbox.insert(tk.END, file)
+        self.scan_queue = queue.Queue()
+        # Taken before scanning so changes made during the scan still invalidate the filename index
+        change_token = self.storage.change_token()
+        # Log quick-open changes from here on; they are replayed on the index built from this scan.
+        # A newer scan starts a fresh log and supersedes any build still pending.
+        self.title_index_generation += 1
+        self.title_index.journal = []
+        threading.Thread(target=self.scan_notes_worker, args=(self.scan_queue,), daemon=True).start()
+        self.root.after(50, self.drain_scan_queue, self.scan_queue, change_token)
+
+    def scan_notes_worker(self, results):
+        """Background thread: push batches of note entries onto the queue, then None when done."""
+        try:
+            for batch in self.storage.scan():
+                results.put(batch)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Could not list notes: {e}")
+        results.put(None)
+
+    def drain_scan_queue(self, results, change_token):
+        """Move scanned batches into the sidebar; reschedules itself until the scan is finished."""
+        if results is not self.scan_queue:
+            return  # A newer scan has replaced this one
+        while True:
+            try:
+                batch = results.get_nowait()
+            except queue.Empty:
+                self.root.after(50, self.drain_scan_queue, results, change_token)
+                return
+            if batch is None:
+                self.filename_index.seed((entry.name for entry in self.note_entries), change_token)
+                if self.watcher is None and isinstance(self.storage, FileStorage):
+                    self.watcher = DirectoryWatcher(
+                        self.storage.directory, lambda changes: self.call_on_ui(self.apply_directory_changes, changes))
+                    self.watcher.start()
+                names = [entry.name for entry in self.note_entries]
+                threading.Thread(target=self.build_title_index, args=(names, self.title_index_generation),
+                                 daemon=True).start()
+                self.sort_notes_listbox()
+                if len(self.startup_marks) < 4:
+                    self.mark_startup("notes listed")
+                    self.report_startup()
+                return
+            self.note_entries.extend(batch)
+            self.notes_listbox.insert(tk.END, *(entry.name for entry in batch))
+
+    def build_title_index(self, names, generation):
+        """Build the quick-open index off the Tk thread and swap it in when done."""
+        self.call_on_ui(self.install_title_index, TitleIndex(names), generation)
+
+    def install_title_index(self, title_index, generation):
+        """Swap in a rebuilt quick-open index, replaying the changes made since its scan began."""
+        if generation != self.title_index_generation:
+            return  # A newer scan is building its own index, from its own log
+        for method, name in self.title_index.journal or ():
+            getattr(title_index, method)(name)
+        self.title_index = title_index
+
+    def sort_key(self):
+        """Key function for the sidebar's selected sort order."""
+        sort_by = self.sort_var.get()
+        if sort_by == "Modified":
+            return lambda entry: -entry.mtime
+        if sort_by == "Size":
+            return lambda entry: -entry.size
+        return lambda entry: entry.name.lower()
+
+    def sort_notes_listbox(self):
+        """Re-sort the sidebar from the cached entries using the selected sort order."""
+        self.note_entries.sort(key=self.sort_key())
+        self.notes_listbox.set_items(entry.name for entry in self.note_entries)
+
+    def insert_note_entry(self, entry):
+        """Insert one entry into the sorted sidebar with a binary search instead of a re-sort."""
+        key = self.sort_key()
+        value = key(entry)
+        low, high = 0, len(self.note_entries)
+        while low < high:
+            middle = (low + high) // 2
+            if key(self.note_entries[middle]) <= value:
+                low = middle + 1
+            else:
+                high = middle
+        self.note_entries.insert(low, entry)
+        self.notes_listbox.insert(low, entry.name)
+
+    def remove_note_entry(self, name):
+        """Remove a note from the sidebar, if listed."""
+        for position, entry in enumerate(self.note_entries):
+            if entry.name == name:
+                del self.note_entries[position]
+                self.notes_listbox.delete(position)
+                return
 
+    def apply_directory_changes(self, changes):
+        """
+        Apply what the directory watcher saw to the sidebar and the in-memory indexes, entry by
+        entry, and flag open tabs whose note was changed, removed or renamed by someone else.
+        """
+        archive = getattr(self.storage, "archive", None)
+        # Only the notes that changed are re-indexed for full-text search
+        indexed = []
+        unindexed = []
+        for name in changes.removed:
+            if archive is not None and name in archive:
+                continue  # Moved into the archive, still a note
+            unindexed.append(name)
+            self.remove_note_entry(name)
+            self.filename_index.discard(name)
+            self.title_index.discard(name)
+            tab = self.find_tab(name)
+            if tab is not None:
+                self.set_changed_on_disk(tab, "deleted")
+        for old_name, entry in changes.renamed:
+            unindexed.append(old_name)
+            indexed.append(entry)
+            self.remove_note_entry(old_name)
+            self.filename_index.discard(old_name)
+            self.title_index.discard(old_name)
+            self.remove_note_entry(entry.name)
+            self.insert_note_entry(entry)
+            self.filename_index.add(entry.name)
+            self.title_index.add(entry.name)
+            tab = self.find_tab(old_name)
+            if tab is not None:
+                # Follow the note to its new name; the tab title is what it is saved under
+                self.notebook.tab(tab, text=entry.name)
+                self.set_changed_on_disk(tab, "renamed")
+        for entry in changes.added + changes.modified:
+            indexed.append(entry)
+            self.remove_note_entry(entry.name)
+            self.insert_note_entry(entry)
+            self.filename_index.add(entry.name)
+            self.title_index.add(entry.name)
+            tab = self.find_tab(entry.name)
+            if tab is not None and tab.base is not None and (tab.base.mtime, tab.base.size) != (entry.mtime, entry.size):
+                self.set_changed_on_disk(tab, "changed")
+        if self.storage.index is not None and (indexed or unindexed):
+            threading.Thread(target=self.index_changed_notes, args=(self.storage, indexed, unindexed),
+                             daemon=True).start()
+
+    def index_changed_notes(self, storage, entries, removed):
+        """Update the search index for notes the watcher saw change (runs off the Tk thread)."""
+        for name in removed:
+            storage.index.remove_note(name)
+        for entry in entries:
+            try:
+                content = "" if storage.index.too_large(entry.size) else storage.read(entry.name)
+            except (OSError, UnicodeDecodeError):
+                continue  # Gone again or not text; the next refresh settles it
+            storage.index.update_note(entry.name, content, entry.mtime, entry.size)
+
+    def set_changed_on_disk(self, tab, state):
+        """Mark (or unmark, with None) a tab whose note changed on disk behind our back."""
+        if tab.changed_on_disk == state:
+            return
+        tab.changed_on_disk = state
+        if state is None:
+            self.notebook.tab(tab, image="")
+            return
+        if self.changed_on_disk_icon is None:
+            self.changed_on_disk_icon = tk.PhotoImage(width=8, height=8)
+            self.changed_on_disk_icon.put("#e69500", to=(0, 0, 8, 8))
+        self.notebook.tab(tab, image=self.changed_on_disk_icon, compound=tk.RIGHT)
+        filename = self.notebook.tab(tab, "text")
+        if state == "changed":
+            self.status_var.set(f"{filename} was changed on disk; use File > Reload From Disk to load it")
+        else:
+            self.status_var.set(f"{filename} was {state} on disk")
+
+    def reload_from_disk(self):
+        """Reload the current note from storage, discarding unsaved edits after confirmation."""
+        tab, text_widget = self.get_current_tab()
+        if not text_widget or tab.storage is None or text_widget.loader:
+            return
+        filename = self.notebook.tab(tab, "text")
+        if tab.changed_on_disk == "deleted":
+            messagebox.showinfo("Reload", f"'{filename}' no longer exists on disk.")
+            return
+        if text_widget.edit_modified() and not messagebox.askyesno(
+                "Reload", f"Discard your unsaved changes to '{filename}' and reload it from disk?"):
+            return
+        self.unload_tab(tab)
+        self.materialize_tab(tab)
+
+    def search_all_notes(self, event=None):
+        """Search every note in the notes directory using the full-text index."""
+        search_term = self.search_var.get()
+        if not search_term:
+            messagebox.showwarning("Input Required", "Please enter a search term.")
+            return
+
+        started = time.perf_counter()
+        results = self.storage.search(search_term)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self.results_listbox.delete(0, tk.END)
+        self.search_results = []
+        for filename, hits, first_offset in results:
+            self.search_results.append((filename, f"1.0+{first_offset}c"))
+            self.results_listbox.insert(tk.END, f"{filename} ({hits})")
+        self.status_var.set(f"Found '{search_term}' in {len(results)} notes ({elapsed_ms:.1f} ms)")
+
+    def grep_all_notes(self):
+        """
+        Scan every note file for the search term (a regex if Regex is checked) across a process
+        pool, streaming one result per matching line into the results list. Esc cancels.
+        """
+        search_term = self.search_var.get()
+        if not search_term:
+            messagebox.showwarning("Input Required", "Please enter a search term.")
+            return
+        if not isinstance(self.storage, FileStorage):
+            messagebox.showinfo("Search", "Scanning all notes needs the file storage; use All for a full-text search.")
+            return
+        pattern = (search_term if self.regex_var.get() else re.escape(search_term)).encode('utf-8')
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            messagebox.showerror("Search", f"Invalid regular expression: {e}")
+            return
+
+        if self.grep is not None:
+            self.grep.cancel()
+        self.results_listbox.delete(0, tk.END)
+        self.search_results = []
+        grep = self.grep = ParallelGrep(self.storage.directory, pattern,
+                                        on_batch=lambda results, searched: self.call_on_ui(
+                                            self.add_grep_results, grep, results, searched))
+        self.status_var.set(f"Searching all notes for '{search_term}'... (Esc to stop)")
+        started = time.perf_counter()
+
+        def run():
+            try:
+                completed = grep.run()
+            except Exception as e:
+                print(f"All-notes search failed: {e}")
+                completed = False
+            self.call_on_ui(self.finish_grep, grep, search_term, completed, time.perf_counter() - started)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def add_grep_results(self, grep, results, files_searched):
+        """Append a finished batch of all-notes search results to the results list."""
+        if grep is not self.grep:
+            return  # Superseded by a newer search
+        for filename, matches in results:
+            for line_number, snippet in matches:
+                if len(self.search_results) >= self.max_grep_results:
+                    grep.cancel()
+                    return
+                self.search_results.append((filename, f"{line_number}.0"))
+                self.results_listbox.insert(tk.END, f"{filename}:{line_number}: {snippet}")
+        self.status_var.set(f"Searching all notes... {files_searched} files, {len(self.search_results)} matching lines")
+
+    def finish_grep(self, grep, search_term, completed, elapsed):
+        """Report the outcome of an all-notes search."""
+        if grep is not self.grep:
+            return
+        self.grep = None
+        if len(self.search_results) >= self.max_grep_results:
+            outcome = f"showing the first {self.max_grep_results} matching lines"
+        elif completed:
+            outcome = f"{len(self.search_results)} matching lines"
+        else:
+            outcome = f"stopped, {len(self.search_results)} matching lines so far"
+        self.status_var.set(f"'{search_term}' in {grep.files_searched} files: {outcome} ({elapsed:.1f} s)")
+
+    def open_search_result(self, event=None):
+        """Open the note selected in the search results and highlight the search term."""
+        selected = self.results_listbox.curselection()
+        if not selected:
+            return
+        filename, index = self.search_results[selected[0]]
+
+        def highlight():
+            tab, text_widget = self.get_current_tab()
+            if text_widget.large_view:
+                # Search on from the start of the matching line
+                text_widget.large_view.go_to_line(int(index.split(".")[0]))
+                self.search_notes(in_note=True)
+                return
+            # The in-note search jumps to the first match at or after the cursor
+            text_widget.mark_set(tk.INSERT, index)
+            text_widget.see(index)
+            self.search_notes(in_note=True)
+
+        self.open_note(filename, on_loaded=highlight)
+
+    @instrumentation.timed("open_selected_note")
     def open_selected_note(self, event):
         """Open the note selected from the sidebar listbox."""
         selected = self.notes_listbox.curselection()
         if selected:
-            filename = self.notes_listbox.get(selected[0])
-            file_path = os.path.join(self.notes_directory, filename)
-            try:
-                with open(file_path, "r", encoding='utf-8') as file:
-                    content = file.read()
-                # Check if the note is already open
-                for tab_id in self.notebook.tabs():
-                    if self.notebook.tab(tab_id, "text").lower() == filename.lower():
-                        self.notebook.select(tab_id)
-                        return
-                # Add a new tab
-                self.add_new_tab(title=filename)
-                tab, text_widget = self.get_current_tab()
-                text_widget.insert(tk.END, content)
-                text_widget.edit_modified(False)
-                self.update_status_bar()
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not open file: {e}")
+            self.open_note(self.notes_listbox.get(selected[0]))
+
+    def open_note(self, filename, on_loaded=None):
+        """
+        Open a note from the notes directory in a new tab, or switch to it if it is already open.
+        on_loaded is called once the note's content is in the widget.
+        Returns True if the note is shown or loading, False otherwise.
+        """
+        # Check if the note is already open
+        tab = self.find_tab(filename)
+        if tab is not None:
+            if tab.text_widget is None:
+                self.materialize_tab(tab, on_loaded)
+                self.notebook.select(tab)
+                return True
+            self.notebook.select(tab)
+            if on_loaded and not tab.text_widget.loader:
+                on_loaded()
+            return True
+
+        return self.load_into_new_tab(self.storage, filename, on_loaded)
 
+    def find_tab(self, filename):
+        """The open tab showing a note (case-insensitive), or None."""
+        for tab_id in self.notebook.tabs():
+            if self.notebook.tab(tab_id, "text").lower() == filename.lower():
+                return self.notebook.nametowidget(tab_id)
+        return None
+
+    def show_quick_open(self):
+        """Ctrl+P palette: fuzzy-match note names on every keystroke and open the chosen one."""
+        if self.quick_open_window is not None and self.quick_open_window.winfo_exists():
+            self.quick_open_window.lift()
+            self.quick_open_window.focus_force()
+            return
+        window = self.quick_open_window = tk.Toplevel(self.root)
+        window.title("Quick Open")
+        window.geometry("520x360")
+        window.transient(self.root)
+
+        query_var = tk.StringVar()
+        entry = tk.Entry(window, textvariable=query_var, font=("Arial", 13))
+        entry.pack(fill=tk.X, padx=5, pady=5)
+        results_listbox = tk.Listbox(window, exportselection=False)
+        results_listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+        matches = []
+
+        def update_matches(*args):
+            started = time.perf_counter()
+            matches[:] = self.title_index.query(query_var.get())
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            results_listbox.delete(0, tk.END)
+            results_listbox.insert(tk.END, *matches)
+            if matches:
+                results_listbox.selection_set(0)
+                results_listbox.activate(0)
+            window.title(f"Quick Open: {len(matches)} matches ({elapsed_ms:.1f} ms)")
+
+        def move_selection(step):
+            if not matches:
+                return "break"
+            selection = results_listbox.curselection()
+            index = min(max((selection[0] if selection else 0) + step, 0), len(matches) - 1)
+            results_listbox.selection_clear(0, tk.END)
+            results_listbox.selection_set(index)
+            results_listbox.activate(index)
+            results_listbox.see(index)
+            return "break"
+
+        def open_selected(event=None):
+            selection = results_listbox.curselection()
+            if selection:
+                filename = matches[selection[0]]
+                window.destroy()
+                self.open_note(filename)
+            return "break"
+
+        query_var.trace_add("write", update_matches)
+        entry.bind("<Down>", lambda event: move_selection(1))
+        entry.bind("<Up>", lambda event: move_selection(-1))
+        entry.bind("<Return>", open_selected)
+        results_listbox.bind("<Double-Button-1>", open_selected)
+        window.bind("<Escape>", lambda event: window.destroy())
+        entry.focus_set()
+
+    def schedule_status_update(self):
+        """Coalesce status bar refreshes so a burst of edits triggers a single update."""
+        if self.status_update_job is None:
+            self.status_update_job = self.root.after(150, self.update_status_bar)
+
+    @instrumentation.timed("update_status_bar")
     def update_status_bar(self, event=None):
-        """Update the status bar with the current file name and word count."""
+        """Update the status bar with the current file name and word, character and line counts."""
+        self.status_update_job = None
         tab, text_widget = self.get_current_tab()
         if not text_widget:
             self.status_var.set("Ready")
             return
+        if text_widget.loader:
+            return  # The loader is reporting progress
         filename = self.notebook.tab(tab, "text")
-        content = text_widget.get(1.0, tk.END)
-        words = len(content.split())
-        self.status_var.set(f"File: {filename} | Words: {words}")
+        if text_widget.large_view:
+            self.status_var.set(f"File: {filename} (read-only) | {text_widget.large_view.status()}")
+            return
+        stats = text_widget.line_stats
+        self.status_var.set(f"File: {filename} | Words: {stats.total_words} | "
+                            f"Chars: {stats.char_count} | Lines: {stats.line_count}")
 
     def exit_app(self):
         """Exit the application after confirming to save changes."""
         if self.confirm_discard_changes():
+            # Let queued writes land and the exit Save All batch report every outcome before
+            # the window goes away
+            batch = self.pending_save_batch
+            self.pending_save_batch = None
+            deadline = time.monotonic() + 30
+            while True:
+                idle = self.save_queue.wait_idle(timeout=0.1)
+                self.run_ui_calls()
+                if (idle and not (batch and batch["pending"])) or time.monotonic() > deadline:
+                    break
+            self.version_queue.wait_idle(timeout=10)
+            if batch and (batch["failed"] or batch["pending"]):
+                failed = [f"{name}: {error}" for name, error in batch["failed"]]
+                if batch["pending"]:
+                    failed.append(f"{batch['pending']} still being written")
+                failed = "\n".join(failed)
+                if not messagebox.askyesno("Save Failed", f"These notes could not be saved:\n{failed}\n\nExit anyway?"):
+                    return
+            # Exit is certain now; stopping these any earlier would leave a kept-open app without them
+            if self.grep is not None:
+                self.grep.cancel()
+            if self.watcher is not None:
+                self.watcher.stop()
+            self.save_session()
             self.root.destroy()
 
     def confirm_discard_changes(self):
@@ -560,11 +2520,11 @@ class EnhancedNoteApp:
         Confirm with the user to discard changes if there are unsaved changes.
         Returns True if it's okay to proceed, False otherwise.
         """
+        self.pending_save_batch = None
         unsaved_tabs = []
         for tab_id in self.notebook.tabs():
-            tab = self.notebook.nametowidget(tab_id)
-            text_widget = tab.winfo_children()[0]
-            if text_widget.edit_modified():
+            text_widget = self.notebook.nametowidget(tab_id).text_widget
+            if text_widget and text_widget.edit_modified() and not text_widget.loader:
                 filename = self.notebook.tab(tab_id, "text")
                 unsaved_tabs.append(filename)
 
@@ -572,12 +2532,14 @@ class EnhancedNoteApp:
             response = messagebox.askyesnocancel("Save Changes",
                                                  f"Do you want to save changes to {', '.join(unsaved_tabs)} before exiting?")
             if response:  # Yes, save changes
+                # Untitled notes still need a name, one Save As each; the rest go out as one batch
                 for tab_id in self.notebook.tabs():
-                    tab = self.notebook.nametowidget(tab_id)
-                    text_widget = tab.winfo_children()[0]
-                    if text_widget.edit_modified():
+                    text_widget = self.notebook.nametowidget(tab_id).text_widget
+                    if (self.notebook.tab(tab_id, "text") == "Untitled" and text_widget
+                            and text_widget.edit_modified() and not text_widget.loader):
                         self.notebook.select(tab_id)
-                        self.save_file()
+                        self.save_as()
+                self.pending_save_batch = self.save_all()
                 return True
             elif response is False:  # No, discard changes
                 return True
@@ -585,8 +2547,84 @@ class EnhancedNoteApp:
                 return False
         return True
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Enhanced Note-Taking App by DevKay")
+    parser.add_argument("--storage", choices=["files", "sqlite"], default="files",
+                        help="where notes are stored: .txt files in Notes/ (default) or an SQLite database")
+    parser.add_argument("--import-notes", action="store_true",
+                        help="copy every note from the Notes folder into the SQLite database and exit")
+    parser.add_argument("--export-notes", action="store_true",
+                        help="copy every note from the SQLite database into the Notes folder and exit")
+    parser.add_argument("--export-bundle", metavar="PATH",
+                        help="write every note to a .jsonl, .md or .zip bundle and exit")
+    parser.add_argument("--import-bundle", metavar="PATH",
+                        help="add the notes of a .jsonl, .md or .zip bundle, replacing same-named notes, and exit")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long each startup stage took")
+    return parser.parse_args()
+
+
+def run_bulk_copy(import_notes):
+    """Copy all notes between the Notes folder and the SQLite database without starting the UI."""
+    base_directory = os.path.dirname(__file__)
+    notes_directory = os.path.join(base_directory, "Notes")
+    data_directory = os.path.join(base_directory, ".notes_data")
+    os.makedirs(notes_directory, exist_ok=True)
+    os.makedirs(data_directory, exist_ok=True)
+
+    folder = FileStorage(notes_directory, NoteIndex(os.path.join(data_directory, "index.sqlite3"), LARGE_NOTE_THRESHOLD))
+    database = SQLiteStorage(os.path.join(data_directory, "notes.sqlite3"))
+    source, destination = (folder, database) if import_notes else (database, folder)
+
+    def progress(count):
+        if count % 1000 == 0:
+            print(f"Copied {count} notes...")
+
+    started = time.perf_counter()
+    count = copy_notes(source, destination, progress)
+    print(f"Copied {count} notes in {time.perf_counter() - started:.1f} s")
+
+
+def run_bundle(args):
+    """Export all notes of the selected storage to a bundle, or import one, without starting the UI."""
+    base_directory = os.path.dirname(__file__)
+    notes_directory = os.path.join(base_directory, "Notes")
+    data_directory = os.path.join(base_directory, ".notes_data")
+    os.makedirs(notes_directory, exist_ok=True)
+    os.makedirs(data_directory, exist_ok=True)
+
+    if args.storage == "sqlite":
+        storage = SQLiteStorage(os.path.join(data_directory, "notes.sqlite3"))
+    else:
+        storage = FileStorage(notes_directory, NoteIndex(os.path.join(data_directory, "index.sqlite3"), LARGE_NOTE_THRESHOLD),
+                              PackArchive(os.path.join(data_directory, "notes.pack")))
+
+    def progress(count):
+        if count % 1000 == 0:
+            print(f"{verb} {count} notes...")
+
+    started = time.perf_counter()
+    skipped = 0
+    if args.export_bundle:
+        verb = "Exported"
+        count = export_notes(storage, args.export_bundle, progress)
+    else:
+        verb = "Imported"
+        count, skipped = import_notes(storage, args.import_bundle, progress)
+    print(f"{verb} {count} notes in {time.perf_counter() - started:.1f} s")
+    if skipped:
+        print(f"Skipped {skipped} entries that are not a plain .txt file name")
+
+
 # Main execution
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = EnhancedNoteApp(root)
-    root.mainloop()
+    args = parse_args()
+    if args.import_notes or args.export_notes:
+        run_bulk_copy(args.import_notes)
+    elif args.export_bundle or args.import_bundle:
+        run_bundle(args)
+    else:
+        root = tk.Tk()
+        app = EnhancedNoteApp(root, storage_backend=args.storage, startup_report=args.startup_report)
+        root.mainloop()
@@ -0,0 +1,202 @@
+"""
+Headless benchmarks for the note core: generates a synthetic corpus and reports the time and
+peak Python memory of listing, opening, saving, indexing, searching and word counting.
+
+    python benchmark.py                      # 10k small notes + one 100 MB note
+    python benchmark.py --notes 1000 --large-mb 10 --json results.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from note_core import (
+    FileStorage, FilenameIndex, LineStats, MappedNote, NoteIndex, SQLiteStorage, SaveQueue, TextPositions,
+    atomic_write, copy_notes, find_matches,
+)
+
+# Rare enough to be selective, common enough to match in every corpus size
+COMMON_TERM = "lorem"
+RARE_TERM = "zyzzyva"
+
+
+def make_vocabulary(rng, size=5000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {"".join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(size)}
+    return sorted(words) + [COMMON_TERM] * 50
+
+
+def make_text(rng, vocabulary, words, words_per_line=12):
+    lines = []
+    for start in range(0, words, words_per_line):
+        lines.append(" ".join(rng.choice(vocabulary) for _ in range(min(words_per_line, words - start))))
+    return "\n".join(lines)
+
+
+def generate_corpus(directory, notes, note_words, large_mb, seed):
+    """Write `notes` small notes plus one large note of roughly large_mb megabytes."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    for number in range(notes):
+        text = make_text(rng, vocabulary, note_words)
+        if number % 997 == 0:
+            text += f" {RARE_TERM}"
+        with open(os.path.join(directory, f"20240101_{number:06d}_note_{number}.txt"), "w", encoding='utf-8') as file:
+            file.write(text)
+
+    large_name = "20240101_000000_large_note.txt"
+    if large_mb:
+        # Repeat a 1 MB block so generating 100+ MB stays quick
+        block = make_text(rng, vocabulary, 180_000) + "\n"
+        with open(os.path.join(directory, large_name), "w", encoding='utf-8') as file:
+            for _ in range(large_mb):
+                file.write(block)
+    return large_name
+
+
+def measure(name, func, repeat=1, track_memory=True):
+    """Run func `repeat` times and return the best/mean wall time and peak traced memory."""
+    if track_memory:
+        tracemalloc.start()
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    peak = 0
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "operation": name,
+        "best_ms": min(timings) * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "peak_mb": peak / (1024 * 1024),
+        "result": result if isinstance(result, (int, float, str)) else None,
+    }
+
+
+def run(args):
+    work_directory = tempfile.mkdtemp(prefix="note_bench_")
+    notes_directory = os.path.join(work_directory, "Notes")
+    os.makedirs(notes_directory)
+    results = []
+
+    def record(name, func, repeat=1):
+        entry = measure(name, func, repeat, track_memory=not args.no_memory)
+        results.append(entry)
+        print(f"{name:<36} {entry['best_ms']:>10.1f} ms  {entry['mean_ms']:>10.1f} ms  {entry['peak_mb']:>8.1f} MB")
+
+    try:
+        print(f"Generating {args.notes} notes and a {args.large_mb} MB note in {work_directory} ...")
+        large_name = generate_corpus(notes_directory, args.notes, args.note_words, args.large_mb, args.seed)
+
+        index = NoteIndex(os.path.join(work_directory, "index.sqlite3"))
+        storage = FileStorage(notes_directory, index)
+
+        print(f"{'operation':<36} {'best':>13}  {'mean':>13}  {'peak':>11}")
+        record("list notes (scan)", lambda: sum(len(batch) for batch in storage.scan()), args.repeat)
+
+        filename_index = FilenameIndex(storage)
+        record("duplicate check (cold)", lambda: "missing.txt" in filename_index)
+        record("duplicate check (warm) x1000",
+               lambda: sum("missing.txt" in filename_index for _ in range(1000)), args.repeat)
+
+        names = [entry.name for batch in storage.scan() for entry in batch if entry.name != large_name]
+        sample = names[:1000]
+        record(f"open {len(sample)} small notes", lambda: sum(len(storage.read(name)) for name in sample), args.repeat)
+
+        if args.large_mb:
+            def open_large():
+                positions = TextPositions()
+                with storage.open(large_name) as file:
+                    while True:
+                        chunk = file.read(256 * 1024)
+                        if not chunk:
+                            return positions.length
+                        positions.extend(chunk)
+            record("open large note (chunked)", open_large, args.repeat)
+
+            def index_large():
+                note = MappedNote(storage.path(large_name))
+                try:
+                    note.build_index()
+                    return note.line_count
+                finally:
+                    note.close()
+            record("index large note (mmap)", index_large, args.repeat)
+
+            large_content = storage.read(large_name)
+            record("save large note (atomic)",
+                   lambda: atomic_write(os.path.join(work_directory, "large_copy.txt"), large_content), args.repeat)
+            record("in-note search (common term)", lambda: len(find_matches(large_content, COMMON_TERM)), args.repeat)
+            record("in-note regex search", lambda: len(find_matches(large_content, r"\bab\w+", use_regex=True)),
+                   args.repeat)
+
+            stats = LineStats()
+            record("word count (full)", lambda: stats.reset(large_content) or stats.total_words)
+
+            def edit_one_line():
+                middle = stats.line_count // 2
+                for _ in range(1000):
+                    stats.replace_lines(middle, 1, ["a freshly typed line of words"])
+                return stats.total_words
+            record("word count (1000 single-line edits)", edit_one_line, args.repeat)
+            del large_content
+
+        save_directory = os.path.join(work_directory, "saves")
+        os.makedirs(save_directory)
+
+        def queued_saves():
+            save_queue = SaveQueue(workers=4)
+            for number in range(1000):
+                save_queue.enqueue(os.path.join(save_directory, f"note_{number}.txt"), f"note {number} " * 100)
+            save_queue.wait_idle()
+            return 1000
+        record("save 1000 notes (save queue)", queued_saves)
+
+        record("build full-text index", lambda: index.refresh(storage))
+        record("index search (common term)", lambda: len(index.query(COMMON_TERM)), args.repeat)
+        record("index search (rare term)", lambda: len(index.query(RARE_TERM)), args.repeat)
+
+        if not args.skip_sqlite:
+            database = SQLiteStorage(os.path.join(work_directory, "notes.sqlite3"))
+            record("import into SQLite", lambda: copy_notes(storage, database))
+            record("SQLite list notes", lambda: sum(len(batch) for batch in database.scan()), args.repeat)
+            record("SQLite FTS search (common term)", lambda: len(database.search(COMMON_TERM)), args.repeat)
+            record("SQLite FTS search (rare term)", lambda: len(database.search(RARE_TERM)), args.repeat)
+    finally:
+        if args.keep:
+            print(f"Corpus kept in {work_directory}")
+        else:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding='utf-8') as file:
+            json.dump({"parameters": vars(args), "results": results}, file, indent=2)
+        print(f"Results written to {args.json}")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the note core on a synthetic corpus")
+    parser.add_argument("--notes", type=int, default=10000, help="number of small notes (default 10000)")
+    parser.add_argument("--note-words", type=int, default=150, help="words per small note (default 150)")
+    parser.add_argument("--large-mb", type=int, default=100, help="size of the large note in MB, 0 to skip")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions for repeatable operations")
+    parser.add_argument("--seed", type=int, default=1234, help="random seed for the corpus")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, no peak memory)")
+    parser.add_argument("--skip-sqlite", action="store_true", help="skip the SQLite backend benchmarks")
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpus")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
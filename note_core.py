@@ -0,0 +1,2169 @@
+"""Tk-free note storage, indexing and text utilities shared by the app and the benchmarks."""
+
+import csv
+import ctypes
+import ctypes.util
+import difflib
+import functools
+import hashlib
+import io
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import select
+import sqlite3
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+# Cached directory entry for a note, used for sorting the sidebar without re-stat'ing files
+NoteEntry = namedtuple("NoteEntry", ["name", "mtime", "size"])
+
+# What an editor last saw of a note on disk: the hash of its content and formatting plus the
+# mtime and size that went with it
+NoteBase = namedtuple("NoteBase", ["content_hash", "mtime", "size"])
+
+
+def scan_notes(directory, batch_size=500):
+    """Yield lists of NoteEntry for the .txt notes in a directory, batch_size entries at a time."""
+    batch = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(".txt"):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                info = entry.stat()
+            except OSError:
+                continue
+            batch.append(NoteEntry(entry.name, info.st_mtime, info.st_size))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def find_matches(content, term, use_regex=False, ignore_case=True):
+    """Return (start, end) character offsets of every non-empty match of term in one pass."""
+    pattern = re.compile(term if use_regex else re.escape(term), re.IGNORECASE if ignore_case else 0)
+    return [(match.start(), match.end()) for match in pattern.finditer(content) if match.end() > match.start()]
+
+
+class TextPositions:
+    """Converts character offsets in a text buffer to Tk 'line.column' indices and back."""
+
+    def __init__(self, content=""):
+        self.line_starts = [0]
+        self.length = 0
+        self.extend(content)
+
+    def extend(self, chunk):
+        """Account for text appended to the end of the buffer."""
+        base = self.length
+        self.line_starts.extend(base + match.end() for match in re.finditer("\n", chunk))
+        self.length += len(chunk)
+
+    def index(self, offset):
+        line = bisect_right(self.line_starts, offset) - 1
+        return f"{line + 1}.{offset - self.line_starts[line]}"
+
+    def offset(self, index):
+        line, column = map(int, str(index).split("."))
+        line = min(line, len(self.line_starts))
+        return min(self.line_starts[line - 1] + column, self.length)
+
+
+# Suffix of the sidecar file that stores a note's formatting next to it
+FORMAT_SUFFIX = ".fmt"
+
+
+def flatten_runs(runs):
+    """
+    Merge possibly overlapping (style, start, end) runs, as written by older versions that
+    saved one run per attribute, into non-overlapping runs whose style combines every run
+    covering them. One sweep over the sorted boundaries; where runs set the same attribute
+    the later run wins, and neighbouring runs with equal styles are joined.
+    """
+    events = []
+    for order, (style, start, end) in enumerate(runs):
+        if end > start:
+            events.append((start, 1, order))
+            events.append((end, 0, order))
+    events.sort()
+
+    flattened = []
+    active = set()
+    previous = None
+    for position, is_start, order in events:
+        if active and position > previous:
+            style = {}
+            for covering in sorted(active):
+                style.update(runs[covering][0])
+            if flattened and flattened[-1][2] == previous and flattened[-1][0] == style:
+                flattened[-1][2] = position
+            else:
+                flattened.append([style, previous, position])
+        previous = position
+        if is_start:
+            active.add(order)
+        else:
+            active.discard(order)
+    return [tuple(run) for run in flattened]
+
+
+def encode_formatting(runs, length):
+    """
+    Encode (style, start, end) runs over a note of the given length as compact JSON: a table of
+    distinct style dicts plus a flat list of [style id, start delta, run length] triples.
+    """
+    styles = {}
+    encoded = []
+    previous_start = 0
+    for style, start, end in sorted(runs, key=lambda run: run[1]):
+        key = json.dumps(style, sort_keys=True)
+        style_id = styles.setdefault(key, len(styles))
+        encoded.extend((style_id, start - previous_start, end - start))
+        previous_start = start
+    return json.dumps({
+        "version": 1,
+        "length": length,
+        "styles": [json.loads(key) for key in styles],
+        "runs": encoded,
+    }, separators=(",", ":"))
+
+
+def decode_formatting(data):
+    """Decode formatting JSON into (runs, length), the reverse of encode_formatting."""
+    document = json.loads(data)
+    styles = document["styles"]
+    encoded = document["runs"]
+    runs = []
+    start = 0
+    for position in range(0, len(encoded), 3):
+        style_id, delta, run_length = encoded[position:position + 3]
+        start += delta
+        runs.append((styles[style_id], start, start + run_length))
+    return runs, document["length"]
+
+
+def atomic_write(file_path, content):
+    """
+    Write text to a file through a temporary file, fsync and os.replace, so a crash mid-write
+    leaves either the old or the new note on disk, never a truncated one.
+    """
+    directory = os.path.dirname(file_path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding='utf-8') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(file_path):
+            os.chmod(temp_path, os.stat(file_path).st_mode)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class NoteHasher:
+    """
+    Incremental hash of a note's text, fed chunk by chunk as it is read or written. Leading
+    and trailing whitespace is left out, as notes are saved stripped, so a note hashes the
+    same whether it was read from disk or taken from the editor.
+    """
+
+    def __init__(self):
+        self.hasher = hashlib.blake2b(digest_size=16)
+        self.started = False
+        # Whitespace at the end of what was fed so far; hashed only once more text follows
+        self.pending = ""
+
+    def update(self, text):
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return
+            self.started = True
+        stripped = text.rstrip()
+        if stripped:
+            self.hasher.update((self.pending + stripped).encode('utf-8'))
+            self.pending = text[len(stripped):]
+        else:
+            self.pending += text
+
+    def digest(self, formatting=None):
+        """Finish with the note's encoded formatting, so a restyle alone also counts as a change."""
+        hasher = self.hasher.copy()
+        hasher.update(b"\0")
+        if formatting:
+            hasher.update(formatting.encode('utf-8'))
+        return hasher.hexdigest()
+
+
+def hash_note(content, formatting=None):
+    hasher = NoteHasher()
+    hasher.update(content)
+    return hasher.digest(formatting)
+
+
+class WriteConflict(Exception):
+    """The note on disk is no longer the version the editor started from."""
+
+
+def checked_write(storage, name, content, formatting=None, base=None):
+    """
+    Write a note unless that would change nothing or overwrite someone else's edit. base is the
+    NoteBase the editor loaded or last saved, or None to write unconditionally. Returns
+    (new base, whether anything was written); raises WriteConflict if the note changed on disk.
+    """
+    content_hash = hash_note(content, formatting)
+    if base is not None:
+        try:
+            current = storage.entry(name)
+        except FileNotFoundError:
+            current = None
+        if current is not None:
+            unchanged = (current.mtime, current.size) == (base.mtime, base.size)
+            if not unchanged:
+                # Touched is not the same as changed: compare what is there with what we started from
+                unchanged = hash_note(storage.read(name), storage.read_formatting(name)) == base.content_hash
+                if not unchanged:
+                    raise WriteConflict(f"'{name}' was changed by another program")
+                base = NoteBase(base.content_hash, current.mtime, current.size)
+            if content_hash == base.content_hash:
+                return base, False
+    storage.write(name, content, formatting)
+    entry = storage.entry(name)
+    return NoteBase(content_hash, entry.mtime, entry.size), True
+
+
+class SaveJob:
+    """A pending write: the latest content for a path and everyone waiting on it."""
+
+    def __init__(self, path, content, callbacks):
+        self.path = path
+        self.content = content
+        self.callbacks = callbacks
+        # Whatever write() returned, for the callbacks
+        self.result = None
+
+
+class SaveQueue:
+    """
+    Writes notes on background worker threads. Callers snapshot the content on the UI thread;
+    repeated saves of a path that is still waiting are coalesced into a single write of the
+    latest content, and writes to the same path never overlap. A path can be any hashable key
+    that write(path, content) understands.
+    """
+
+    def __init__(self, write=atomic_write, workers=1):
+        self.write = write
+        self.pending = OrderedDict()
+        self.in_flight = set()
+        self.condition = threading.Condition()
+        for _ in range(workers):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def enqueue(self, path, content, on_done=None):
+        """
+        Queue content to be written to path. on_done(job, error) is called on the worker thread
+        once the write finishes; error is None on success.
+        """
+        with self.condition:
+            job = self.pending.get(path)
+            if job:
+                job.content = content
+            else:
+                job = self.pending[path] = SaveJob(path, content, [])
+            if on_done:
+                job.callbacks.append(on_done)
+            self.condition.notify()
+
+    def next_job(self):
+        """Block until there is a pending path that is not being written, then claim it."""
+        with self.condition:
+            while True:
+                path = next((path for path in self.pending if path not in self.in_flight), None)
+                if path is not None:
+                    self.in_flight.add(path)
+                    return self.pending.pop(path)
+                self.condition.wait()
+
+    def worker(self):
+        while True:
+            job = self.next_job()
+            error = None
+            try:
+                job.result = self.write(job.path, job.content)
+            except Exception as e:
+                error = e
+            # Callbacks run before the path is marked idle, so whatever they report is already
+            # posted when wait_idle() returns
+            for callback in job.callbacks:
+                try:
+                    callback(job, error)
+                except Exception as e:
+                    print(f"Save callback failed for {job.path}: {e}")
+            with self.condition:
+                self.in_flight.discard(job.path)
+                self.condition.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Block until every queued write has finished and its callbacks have run. Returns False on timeout."""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.in_flight, timeout)
+
+
+class FilenameIndex:
+    """
+    Case-folded set of the note names in a storage. The storage is only rescanned when its
+    change token no longer matches the one recorded at the last scan or at our own last write.
+    Safe to update from save worker threads.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.names = set()
+        self.reserved = set()  # Names claimed by saves that have not landed yet; survive rescans
+        self.change_token = None
+        self.lock = threading.Lock()
+
+    def seed(self, names, change_token):
+        """Fill the index from an existing scan taken when the storage had the given change token."""
+        names = {name.casefold() for name in names}
+        with self.lock:
+            self.names = names
+            self.change_token = change_token
+
+    def refresh_if_stale(self):
+        """Rescan the storage if something other than us has changed it since the last scan."""
+        change_token = self.storage.change_token()
+        if change_token != self.change_token:
+            self.seed((entry.name for batch in self.storage.scan() for entry in batch), change_token)
+
+    def add(self, name, token_before=None):
+        """
+        Record a note that now exists. token_before is the storage's change token from just
+        before our own write of it: if the index was current then, the new token is adopted so
+        our write does not invalidate it. Otherwise (or without a token) the index stays stale,
+        so changes made by others are still picked up by the next rescan.
+        """
+        with self.lock:
+            self.names.add(name.casefold())
+            if token_before is not None and token_before == self.change_token:
+                self.change_token = self.storage.change_token()
+
+    def discard(self, name, token_before=None):
+        """Forget a note that was removed; token_before works as for add()."""
+        with self.lock:
+            self.names.discard(name.casefold())
+            if token_before is not None and token_before == self.change_token:
+                self.change_token = self.storage.change_token()
+
+    def reserve(self, name):
+        """Claim a name for a save that is about to be queued."""
+        with self.lock:
+            self.reserved.add(name.casefold())
+
+    def release(self, name):
+        """Drop a claim once its save has landed (or failed)."""
+        with self.lock:
+            self.reserved.discard(name.casefold())
+
+    def __contains__(self, name):
+        self.refresh_if_stale()
+        key = name.casefold()
+        return key in self.names or key in self.reserved
+
+
+def fuzzy_score(query, key):
+    """
+    Score how well the characters of query appear in order in key (higher is better), or
+    return None if they do not. Consecutive characters and word starts earn a bonus, gaps cost.
+    """
+    score = 0
+    position = 0
+    previous = -2
+    for character in query:
+        found = key.find(character, position)
+        if found < 0:
+            return None
+        if found == previous + 1:
+            score += 5
+        if found == 0 or key[found - 1] == " ":
+            score += 8
+        score -= min(found - position, 5)
+        previous = found
+        position = found + 1
+    return score - len(key) // 8
+
+
+class TitleIndex:
+    """
+    In-memory fuzzy matcher over note names for quick-open. Each name is reduced to a search key
+    (timestamp prefix and extension dropped, separators folded). A bitmap per character narrows
+    a query to the names holding all of its characters, and bigram/trigram id arrays find the
+    names containing it verbatim, so a keystroke only scores a bounded number of names.
+    """
+
+    TIMESTAMP_PREFIX = re.compile(r"^\d{8}_\d{6}_")
+    SEPARATORS = re.compile(r"[\s_.\-]+")
+    NONZERO_BYTE = re.compile(rb"[^\x00]")
+    # Upper bound on names fuzzy-scored per keystroke, which keeps short queries fast on huge
+    # folders. Verbatim matches are taken earliest position first, so the cut keeps the best.
+    MAX_SCORED = 2000
+    # Key positions with a bitmap per character, for finding the earliest verbatim matches first
+    TRACKED_POSITIONS = 8
+
+    def __init__(self, names=()):
+        self.names = []
+        self.keys = []
+        self.compact_keys = []
+        self.ids = {}
+        self.characters = {}
+        self.starts = {}  # (position, character) -> bitmap of keys with that character there
+        self.grams = {}
+        self.last_query = ("", 0)
+        # While a replacement index is built from a scan, add() and discard() are logged here as
+        # (method name, note name) so they can be replayed on it
+        self.journal = None
+        # Bulk load: collect ids per character first, then turn each list into one bitmap
+        character_ids = {}
+        start_ids = {}
+        for name in names:
+            number = self.append(name)
+            if number is not None:
+                compact = self.compact_keys[number]
+                for character in set(compact):
+                    character_ids.setdefault(character, []).append(number)
+                for position, character in enumerate(compact[:self.TRACKED_POSITIONS]):
+                    start_ids.setdefault((position, character), []).append(number)
+        for bitmaps, ids in ((self.characters, character_ids), (self.starts, start_ids)):
+            for key, numbers in ids.items():
+                bits = bytearray((len(self.names) + 7) // 8)
+                for number in numbers:
+                    bits[number >> 3] |= 1 << (number & 7)
+                bitmaps[key] = int.from_bytes(bits, "little")
+
+    def search_key(self, name):
+        stem = self.TIMESTAMP_PREFIX.sub("", name)
+        if stem.lower().endswith(".txt"):
+            stem = stem[:-4]
+        return self.SEPARATORS.sub(" ", stem).strip().casefold()
+
+    def append(self, name):
+        """Store a name and its bigram/trigram postings; returns its id, or None if already present."""
+        if name.casefold() in self.ids:
+            return None
+        number = len(self.names)
+        key = self.search_key(name)
+        compact = key.replace(" ", "")
+        self.names.append(name)
+        self.keys.append(key)
+        self.compact_keys.append(compact)
+        self.ids[name.casefold()] = number
+        for gram in {compact[i:i + size] for size in (2, 3) for i in range(len(compact) - size + 1)}:
+            numbers = self.grams.get(gram)
+            if numbers is None:
+                numbers = self.grams[gram] = array("I")
+            numbers.append(number)
+        return number
+
+    def add(self, name):
+        """Index a note name; names already present (case-insensitively) are ignored."""
+        if self.journal is not None:
+            self.journal.append(("add", name))
+        number = self.append(name)
+        if number is not None:
+            compact = self.compact_keys[number]
+            for character in set(compact):
+                self.characters[character] = self.characters.get(character, 0) | (1 << number)
+            for start in enumerate(compact[:self.TRACKED_POSITIONS]):
+                self.starts[start] = self.starts.get(start, 0) | (1 << number)
+            self.last_query = ("", 0)
+
+    def discard(self, name):
+        """
+        Remove a note name. Clearing its character bits is enough to hide it; the stale
+        gram entries never pass the character filter.
+        """
+        if self.journal is not None:
+            self.journal.append(("discard", name))
+        number = self.ids.pop(name.casefold(), None)
+        if number is None:
+            return
+        compact = self.compact_keys[number]
+        for character in set(compact):
+            self.characters[character] &= ~(1 << number)
+        for start in enumerate(compact[:self.TRACKED_POSITIONS]):
+            self.starts[start] &= ~(1 << number)
+        self.names[number] = None
+        self.last_query = ("", 0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def candidate_ids(self, bits):
+        """Yield the ids whose bit is set, skipping empty bytes in C."""
+        for match in self.NONZERO_BYTE.finditer(bits):
+            base = match.start() * 8
+            value = bits[match.start()]
+            while value:
+                low = value & -value
+                yield base + low.bit_length() - 1
+                value ^= low
+
+    def query(self, text, limit=50):
+        """Return up to limit note names matching text, best first."""
+        query = self.SEPARATORS.sub("", text).casefold()
+        if not query:
+            return []
+        # Typing one more character can only narrow the previous query's candidates
+        previous, candidates = self.last_query
+        if not previous or not query.startswith(previous):
+            candidates = -1
+            previous = ""
+        for character in set(query) - set(previous):
+            candidates &= self.characters.get(character, 0)
+        self.last_query = (query, candidates)
+        if not candidates:
+            return []
+        size = (len(self.names) + 7) // 8
+        bits = candidates.to_bytes(size, "little")
+
+        # Names containing the query verbatim rank above scattered matches. Take them earliest
+        # position first: the tracked positions straight from their bitmaps, then any others
+        verbatim = []
+        for position in range(self.TRACKED_POSITIONS):
+            at = candidates & self.starts.get((position, query[0]), 0)
+            if not at:
+                continue
+            for number in self.candidate_ids(at.to_bytes(size, "little")):
+                # Only the first occurrence counts, so a name is taken once
+                if self.compact_keys[number].find(query, 0, position + len(query)) == position:
+                    verbatim.append((position, number))
+                    if len(verbatim) >= self.MAX_SCORED:
+                        break
+            if len(verbatim) >= self.MAX_SCORED:
+                break
+        if len(verbatim) < self.MAX_SCORED:
+            if len(query) >= 2:
+                gram = min(len(query), 3)
+                rarest = min((self.grams.get(query[i:i + gram], ()) for i in range(len(query) - gram + 1)), key=len)
+                likely = (number for number in rarest if bits[number >> 3] >> (number & 7) & 1)
+            else:
+                likely = self.candidate_ids(bits)
+            for number in likely:
+                # The first occurrence decides; earlier ones were collected above
+                position = self.compact_keys[number].find(query)
+                if position >= self.TRACKED_POSITIONS:
+                    verbatim.append((position, number))
+                    if len(verbatim) >= self.MAX_SCORED:
+                        break
+        ranked = []
+        scored = set()
+        for position, number in verbatim[:self.MAX_SCORED]:
+            ranked.append((fuzzy_score(query, self.keys[number]) + 100 - min(position, 20), self.names[number]))
+            scored.add(number)
+        if len(ranked) < limit:
+            attempts = len(scored)
+            for number in self.candidate_ids(bits):
+                if attempts >= self.MAX_SCORED:
+                    break
+                if number in scored:
+                    continue
+                attempts += 1
+                score = fuzzy_score(query, self.keys[number])
+                if score is not None:
+                    ranked.append((score, self.names[number]))
+        # Ties go to the newest timestamp prefix
+        ranked.sort(reverse=True)
+        return [name for score, name in ranked[:limit]]
+
+
+class NoteIndex:
+    """
+    Persistent inverted index mapping each term to the notes and offsets it occurs at. Notes
+    of max_note_size bytes or more are recorded without their terms, so they are never read.
+    """
+
+    TOKEN_PATTERN = re.compile(r"\w+")
+
+    def __init__(self, index_path, max_note_size=None):
+        self.index_path = index_path
+        self.max_note_size = max_note_size
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(index_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS notes (
+                    name TEXT PRIMARY KEY,
+                    mtime REAL,
+                    size INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT,
+                    name TEXT,
+                    positions TEXT,
+                    PRIMARY KEY (term, name)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS postings_name ON postings (name);
+            """)
+
+    def tokenize(self, content):
+        """Return a dict mapping each lowercased term to the character offsets it starts at."""
+        terms = {}
+        for match in self.TOKEN_PATTERN.finditer(content.lower()):
+            terms.setdefault(match.group(), []).append(match.start())
+        return terms
+
+    def too_large(self, size):
+        """Whether a note of size bytes is listed without its terms."""
+        return self.max_note_size is not None and size is not None and size >= self.max_note_size
+
+    def postings(self, name, content, size):
+        """(term, name, positions) rows for a note; none for notes too large to index."""
+        if self.too_large(size):
+            return []
+        return [(term, name, ",".join(map(str, offsets))) for term, offsets in self.tokenize(content).items()]
+
+    def _write_note(self, name, postings, mtime, size):
+        """Replace the postings of a single note. The caller holds the lock and transaction."""
+        self.connection.execute("DELETE FROM postings WHERE name = ?", (name,))
+        self.connection.executemany("INSERT INTO postings (term, name, positions) VALUES (?, ?, ?)", postings)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO notes (name, mtime, size) VALUES (?, ?, ?)", (name, mtime, size)
+        )
+
+    def update_note(self, name, content, mtime=None, size=None):
+        """Index (or re-index) a note after it has been written."""
+        postings = self.postings(name, content, size)
+        with self.lock, self.connection:
+            self._write_note(name, postings, mtime, size)
+
+    def remove_note(self, name):
+        """Drop a note from the index."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM postings WHERE name = ?", (name,))
+            self.connection.execute("DELETE FROM notes WHERE name = ?", (name,))
+
+    def refresh(self, storage, batch_size=200):
+        """Bring the index in line with a storage's notes, re-indexing only new or changed ones."""
+        with self.lock:
+            known = {name: (mtime, size) for name, mtime, size in
+                     self.connection.execute("SELECT name, mtime, size FROM notes")}
+
+        stale = []
+        seen = set()
+        for batch in storage.scan():
+            for entry in batch:
+                seen.add(entry.name)
+                if known.get(entry.name) != (entry.mtime, entry.size):
+                    stale.append(entry)
+
+        # Read and tokenize without the lock, so searches are not held up by disk reads; the
+        # lock is only taken to write each batch
+        for start in range(0, len(stale), batch_size):
+            batch = []
+            for name, mtime, size in stale[start:start + batch_size]:
+                try:
+                    content = "" if self.too_large(size) else storage.read(name)
+                except (OSError, UnicodeDecodeError):
+                    continue
+                batch.append((name, self.postings(name, content, size), mtime, size))
+            with self.lock, self.connection:
+                for note in batch:
+                    self._write_note(*note)
+
+        removed = [name for name in known if name not in seen]
+        if removed:
+            with self.lock, self.connection:
+                self.connection.executemany("DELETE FROM postings WHERE name = ?", ((n,) for n in removed))
+                self.connection.executemany("DELETE FROM notes WHERE name = ?", ((n,) for n in removed))
+
+    def query(self, text, limit=500):
+        """
+        Return notes containing every term of the query as (name, hits, first_offset) tuples,
+        best matches first.
+        """
+        terms = list(dict.fromkeys(self.TOKEN_PATTERN.findall(text.lower())))
+        if not terms:
+            return []
+
+        matches = None
+        with self.lock:
+            for term in terms:
+                rows = self.connection.execute(
+                    "SELECT name, positions FROM postings WHERE term = ?", (term,)
+                ).fetchall()
+                postings = {name: positions.split(",") for name, positions in rows}
+                if matches is None:
+                    matches = {name: [len(offsets), int(offsets[0])] for name, offsets in postings.items()}
+                else:
+                    matches = {name: [hits + len(postings[name]), min(first, int(postings[name][0]))]
+                               for name, (hits, first) in matches.items() if name in postings}
+                if not matches:
+                    return []
+
+        results = sorted(((name, hits, first) for name, (hits, first) in matches.items()),
+                         key=lambda result: (-result[1], result[0]))
+        return results[:limit]
+
+
+class LineStats:
+    """Cached per-line word and character counts for a text buffer, updated one edit at a time."""
+
+    def __init__(self):
+        self.words = [0]
+        self.chars = [0]
+        self.total_words = 0
+        self.total_chars = 0
+
+    def replace_lines(self, first, count, lines):
+        """Replace `count` cached lines starting at zero-based line `first` with the counts of `lines`."""
+        new_words = [len(line.split()) for line in lines]
+        new_chars = [len(line) for line in lines]
+        self.total_words += sum(new_words) - sum(self.words[first:first + count])
+        self.total_chars += sum(new_chars) - sum(self.chars[first:first + count])
+        self.words[first:first + count] = new_words
+        self.chars[first:first + count] = new_chars
+
+    def reset(self, content):
+        """Recount the whole buffer from scratch."""
+        self.words = [0]
+        self.chars = [0]
+        self.total_words = 0
+        self.total_chars = 0
+        self.replace_lines(0, 1, content.split("\n"))
+
+    @property
+    def line_count(self):
+        return len(self.words)
+
+    @property
+    def char_count(self):
+        # Newlines between lines count as characters too
+        return self.total_chars + self.line_count - 1
+
+
+# Location of one record in a PackArchive: payload offset, compressed and original sizes, mtime
+ArchiveEntry = namedtuple("ArchiveEntry", ["name", "offset", "stored_size", "size", "mtime"])
+
+
+class PackArchive:
+    """
+    Append-only pack file of zlib-compressed notes. Each record is a header, the UTF-8 name and
+    the compressed bytes, so one note can be read without decompressing the rest. The offset
+    index is kept in a JSON file next to the pack; records appended after it was last written
+    are replayed from their headers on load. Removing a note appends a tombstone, and
+    compact() rewrites the pack with only the live records.
+    """
+
+    MAGIC = b"NOTEPACK"
+    HEADER = struct.Struct("<BHIId")  # flags, name length, stored length, original size, mtime
+    TOMBSTONE = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dead_bytes = 0
+        self.load()
+
+    def record_size(self, entry):
+        return self.HEADER.size + len(entry.name.encode('utf-8')) + entry.stored_size
+
+    def load(self):
+        """Read the offset index, then replay the records appended after it was saved."""
+        start = len(self.MAGIC)
+        try:
+            with open(self.index_path, "r", encoding='utf-8') as file:
+                document = json.load(file)
+            entries = {name.casefold(): ArchiveEntry(name, *fields) for name, fields in document["entries"].items()}
+            dead_bytes, indexed_size = document["dead_bytes"], document["pack_size"]
+        except (OSError, ValueError, KeyError, TypeError):
+            entries, dead_bytes, indexed_size = {}, 0, start
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b") as file:
+            if file.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError(f"{self.path} is not a note pack")
+            pack_size = os.fstat(file.fileno()).st_size
+            if indexed_size <= pack_size:
+                self.entries, self.dead_bytes, start = entries, dead_bytes, indexed_size
+            end = self._replay(file, start, pack_size)
+            if end < pack_size:
+                # A crash mid-append left a partial record; drop it so new records follow good ones
+                file.truncate(end)
+        if end != indexed_size:
+            self.save_index()
+
+    def _replay(self, file, offset, pack_size):
+        """Apply the records from offset on to the index; returns the end of the last whole record."""
+        file.seek(offset)
+        while offset + self.HEADER.size <= pack_size:
+            flags, name_length, stored_size, size, mtime = self.HEADER.unpack(file.read(self.HEADER.size))
+            payload_offset = offset + self.HEADER.size + name_length
+            if payload_offset + stored_size > pack_size:
+                break
+            name = file.read(name_length).decode('utf-8')
+            file.seek(stored_size, os.SEEK_CUR)
+            self._apply(ArchiveEntry(name, payload_offset, stored_size, size, mtime), flags)
+            offset = payload_offset + stored_size
+        return offset
+
+    def _apply(self, entry, flags):
+        previous = self.entries.pop(entry.name.casefold(), None)
+        if previous is not None:
+            self.dead_bytes += self.record_size(previous)
+        if flags & self.TOMBSTONE:
+            self.dead_bytes += self.record_size(entry)
+        else:
+            self.entries[entry.name.casefold()] = entry
+
+    def save_index(self):
+        document = {
+            "pack_size": os.path.getsize(self.path),
+            "dead_bytes": self.dead_bytes,
+            "entries": {entry.name: list(entry[1:]) for entry in self.entries.values()},
+        }
+        atomic_write(self.index_path, json.dumps(document, separators=(",", ":")))
+
+    def _append(self, records):
+        """Append (flags, name, data, size, mtime) records in one write and fsync."""
+        with open(self.path, "ab") as file:
+            if not file.tell():
+                file.write(self.MAGIC)
+            offset = file.tell()
+            for flags, name, data, size, mtime in records:
+                encoded_name = name.encode('utf-8')
+                file.write(self.HEADER.pack(flags, len(encoded_name), len(data), size, mtime))
+                file.write(encoded_name)
+                file.write(data)
+                payload_offset = offset + self.HEADER.size + len(encoded_name)
+                self._apply(ArchiveEntry(name, payload_offset, len(data), size, mtime), flags)
+                offset = payload_offset + len(data)
+            file.flush()
+            os.fsync(file.fileno())
+        self.save_index()
+
+    def add(self, notes):
+        """Store (name, bytes, mtime) notes, replacing earlier records of the same names."""
+        with self.lock:
+            self._append([(0, name, zlib.compress(data, 6), len(data), mtime) for name, data, mtime in notes])
+
+    def remove(self, names):
+        """Drop notes from the archive by appending tombstones for the ones it holds."""
+        with self.lock:
+            records = [(self.TOMBSTONE, self.entries[name.casefold()].name, b"", 0, 0.0)
+                       for name in names if name.casefold() in self.entries]
+            if records:
+                self._append(records)
+
+    def __contains__(self, name):
+        return name.casefold() in self.entries
+
+    def size(self, name):
+        return self.entries[name.casefold()].size
+
+    def read(self, name):
+        """Return a note's bytes, decompressing only its own record."""
+        with self.lock:
+            entry = self.entries.get(name.casefold())
+            if entry is None:
+                raise FileNotFoundError(name)
+            with open(self.path, "rb") as file:
+                file.seek(entry.offset)
+                return zlib.decompress(file.read(entry.stored_size))
+
+    def note_entries(self):
+        """NoteEntry for every archived note (formatting records excluded)."""
+        return [NoteEntry(entry.name, entry.mtime, entry.size) for entry in list(self.entries.values())
+                if entry.name.lower().endswith(".txt")]
+
+    def compact(self):
+        """Rewrite the pack with only its live records; returns the number of bytes reclaimed."""
+        with self.lock:
+            if not self.dead_bytes or not os.path.exists(self.path):
+                return 0
+            old_size = os.path.getsize(self.path)
+            entries = sorted(self.entries.values(), key=lambda entry: entry.offset)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as target, open(self.path, "rb") as source:
+                    target.write(self.MAGIC)
+                    compacted = {}
+                    for entry in entries:
+                        # Copy the compressed bytes as they are, no recompression
+                        source.seek(entry.offset)
+                        data = source.read(entry.stored_size)
+                        encoded_name = entry.name.encode('utf-8')
+                        target.write(self.HEADER.pack(0, len(encoded_name), len(data), entry.size, entry.mtime))
+                        target.write(encoded_name)
+                        compacted[entry.name.casefold()] = entry._replace(offset=target.tell())
+                        target.write(data)
+                    target.flush()
+                    os.fsync(target.fileno())
+                os.replace(temp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+            self.entries = compacted
+            self.dead_bytes = 0
+            self.save_index()
+            return old_size - os.path.getsize(self.path)
+
+
+class FileStorage:
+    """
+    Notes stored as individual .txt files in a directory, with formatting in .fmt sidecars and
+    an optional NoteIndex for full-text search. With a PackArchive, notes moved into the pack
+    by archive_notes() are listed and read as if they were still files.
+    """
+
+    def __init__(self, directory, index=None, archive=None):
+        self.directory = directory
+        self.index = index
+        self.archive = archive
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def scan(self, batch_size=500):
+        """Yield lists of NoteEntry, batch_size entries at a time."""
+        if self.archive is None:
+            return scan_notes(self.directory, batch_size)
+        return self._scan_with_archive(batch_size)
+
+    def _scan_with_archive(self, batch_size):
+        seen = set()
+        for batch in scan_notes(self.directory, batch_size):
+            seen.update(entry.name.casefold() for entry in batch)
+            yield batch
+        archived = [entry for entry in self.archive.note_entries() if entry.name.casefold() not in seen]
+        for start in range(0, len(archived), batch_size):
+            yield archived[start:start + batch_size]
+
+    def change_token(self):
+        """A value that changes whenever notes are added, removed or renamed."""
+        return os.stat(self.directory).st_mtime
+
+    def entry(self, name):
+        """NoteEntry with the note's current mtime and size; raises FileNotFoundError if missing."""
+        try:
+            info = os.stat(self.path(name))
+            return NoteEntry(name, info.st_mtime, info.st_size)
+        except FileNotFoundError:
+            if self.archive is not None and name in self.archive:
+                archived = self.archive.entries[name.casefold()]
+                return NoteEntry(name, archived.mtime, archived.size)
+            raise
+
+    def size(self, name):
+        try:
+            return os.path.getsize(self.path(name))
+        except FileNotFoundError:
+            if self.archive is not None and name in self.archive:
+                return self.archive.size(name)
+            raise
+
+    def open(self, name):
+        """Open a note for streaming reads."""
+        try:
+            return open(self.path(name), "r", encoding='utf-8')
+        except FileNotFoundError:
+            if self.archive is not None and name in self.archive:
+                return io.StringIO(self.archive.read(name).decode('utf-8'))
+            raise
+
+    def read(self, name):
+        with self.open(name) as file:
+            return file.read()
+
+    def read_formatting(self, name):
+        """Return the note's encoded formatting, or None if it has none."""
+        try:
+            with open(self.path(name) + FORMAT_SUFFIX, "r", encoding='utf-8') as file:
+                return file.read()
+        except FileNotFoundError:
+            if self.archive is not None and name + FORMAT_SUFFIX in self.archive:
+                return self.archive.read(name + FORMAT_SUFFIX).decode('utf-8')
+            return None
+
+    def write(self, name, content, formatting=None):
+        """Atomically write a note and its formatting sidecar, then update the search index."""
+        file_path = self.path(name)
+        atomic_write(file_path, content)
+        if formatting is not None:
+            atomic_write(file_path + FORMAT_SUFFIX, formatting)
+        elif os.path.exists(file_path + FORMAT_SUFFIX):
+            os.remove(file_path + FORMAT_SUFFIX)
+        if self.archive is not None and name in self.archive:
+            # The file on disk is now the current version
+            self.archive.remove([name, name + FORMAT_SUFFIX])
+        if self.index:
+            info = os.stat(file_path)
+            self.index.update_note(name, content, info.st_mtime, info.st_size)
+
+    def write_many(self, notes):
+        """Write (name, content, formatting) tuples; returns how many were written."""
+        count = 0
+        for name, content, formatting in notes:
+            self.write(name, content, formatting)
+            count += 1
+        return count
+
+    def remove(self, name):
+        file_path = self.path(name)
+        if self.archive is not None and name in self.archive:
+            self.archive.remove([name, name + FORMAT_SUFFIX])
+            if not os.path.exists(file_path):
+                if self.index:
+                    self.index.remove_note(name)
+                return
+        os.remove(file_path)
+        if os.path.exists(file_path + FORMAT_SUFFIX):
+            os.remove(file_path + FORMAT_SUFFIX)
+        if self.index:
+            self.index.remove_note(name)
+
+    def archive_notes(self, older_than, exclude=(), batch_size=200):
+        """
+        Move notes last modified before the timestamp older_than (and their formatting) into
+        the archive, skipping names in exclude. A batch's files are deleted only once its
+        records are safely in the pack. Returns the number of notes archived.
+        """
+        excluded = {name.casefold() for name in exclude}
+        candidates = [entry.name for batch in scan_notes(self.directory) for entry in batch
+                      if entry.mtime < older_than and entry.name.casefold() not in excluded]
+        archived = 0
+        for start in range(0, len(candidates), batch_size):
+            records = []
+            paths = []
+            for name in candidates[start:start + batch_size]:
+                for record_name in (name, name + FORMAT_SUFFIX):
+                    record_path = self.path(record_name)
+                    try:
+                        with open(record_path, "rb") as file:
+                            records.append((record_name, file.read(), os.fstat(file.fileno()).st_mtime))
+                    except FileNotFoundError:
+                        continue
+                    paths.append(record_path)
+            self.archive.add(records)
+            for record_path in paths:
+                os.remove(record_path)
+            archived += sum(1 for name, data, mtime in records if not name.endswith(FORMAT_SUFFIX))
+        return archived
+
+    def refresh_index(self):
+        """Bring the search index up to date with the notes."""
+        if self.index:
+            self.index.refresh(self)
+
+    def search(self, query, limit=500):
+        """Return (name, hits, first_offset) tuples for notes containing every query term."""
+        return self.index.query(query, limit) if self.index else []
+
+
+# What a DirectoryWatcher saw change: NoteEntry lists for added and modified notes, names of
+# removed notes and (old name, NoteEntry) pairs for renamed ones
+DirectoryChanges = namedtuple("DirectoryChanges", ["added", "removed", "renamed", "modified"])
+
+
+class DirectoryWatcher:
+    """
+    Watches a notes directory from a background thread and calls on_changes(DirectoryChanges)
+    with the difference from what it saw last. On Linux, inotify (through ctypes) says which
+    names to re-stat. Elsewhere the directory's own mtime is checked every `interval` seconds
+    and the directory rescanned when it changes (a note added, removed or renamed, which
+    includes atomic saves), or every `full_scan_interval` seconds regardless to catch notes
+    edited in place. A note that disappears under one name and appears under another with the
+    same inode is a rename.
+    """
+
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+    def __init__(self, directory, on_changes, interval=2.0, debounce=0.2, full_scan_interval=30.0):
+        self.directory = directory
+        self.on_changes = on_changes
+        self.interval = interval
+        self.full_scan_interval = full_scan_interval
+        self.debounce = debounce
+        self.snapshot = {}
+        self.stopped = threading.Event()
+        self.uses_inotify = False
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def stat(self, name):
+        """(mtime, size, inode) of a note, or None if it is gone or not a regular file."""
+        try:
+            info = os.stat(os.path.join(self.directory, name))
+        except OSError:
+            return None
+        return (info.st_mtime, info.st_size, info.st_ino) if stat.S_ISREG(info.st_mode) else None
+
+    def take_snapshot(self):
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(".txt"):
+                    try:
+                        if entry.is_file():
+                            info = entry.stat()
+                            snapshot[entry.name] = (info.st_mtime, info.st_size, entry.inode())
+                    except OSError:
+                        continue
+        return snapshot
+
+    @staticmethod
+    def diff(old, new):
+        """Compare two {name: (mtime, size, inode)} snapshots."""
+        removed = [name for name in old if name not in new]
+        removed_by_inode = {old[name][2]: name for name in removed if old[name][2]}
+        added = []
+        renamed = []
+        for name in new:
+            if name in old:
+                continue
+            mtime, size, inode = new[name]
+            source = removed_by_inode.pop(inode, None) if inode else None
+            if source is not None:
+                renamed.append((source, NoteEntry(name, mtime, size)))
+            else:
+                added.append(NoteEntry(name, mtime, size))
+        renamed_sources = {source for source, entry in renamed}
+        removed = [name for name in removed if name not in renamed_sources]
+        modified = [NoteEntry(name, *new[name][:2]) for name in new
+                    if name in old and new[name][:2] != old[name][:2]]
+        return DirectoryChanges(added, removed, renamed, modified)
+
+    def report(self, current):
+        changes = self.diff(self.snapshot, current)
+        self.snapshot = current
+        if any(changes):
+            self.on_changes(changes)
+
+    def open_inotify(self):
+        """An inotify descriptor watching the directory, or None where inotify is unavailable."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            if libc.inotify_add_watch(fd, os.fsencode(self.directory), self.WATCH_MASK) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def read_events(self, fd, names):
+        """Add the note names of all pending events to names; returns True if the queue overflowed."""
+        overflow = False
+        while True:
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                return overflow
+            offset = 0
+            while offset + self.EVENT.size <= len(data):
+                wd, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + self.EVENT.size:offset + self.EVENT.size + length].rstrip(b"\0"))
+                offset += self.EVENT.size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                elif name.lower().endswith(".txt"):
+                    names.add(name)
+
+    def run(self):
+        try:
+            # Taken before the snapshot so a change made while it is taken still triggers a rescan
+            directory_mtime = os.stat(self.directory).st_mtime
+            self.snapshot = self.take_snapshot()
+        except OSError as e:
+            print(f"Could not watch {self.directory}: {e}")
+            return
+        fd = self.open_inotify()
+        self.uses_inotify = fd is not None
+        if fd is None:
+            last_scan = time.monotonic()
+            while not self.stopped.wait(self.interval):
+                try:
+                    # One stat per interval; the full sweep stats every note
+                    current_mtime = os.stat(self.directory).st_mtime
+                    if current_mtime == directory_mtime and time.monotonic() - last_scan < self.full_scan_interval:
+                        continue
+                    directory_mtime = current_mtime
+                    last_scan = time.monotonic()
+                    self.report(self.take_snapshot())
+                except OSError as e:
+                    print(f"Could not rescan {self.directory}: {e}")
+            return
+        try:
+            while not self.stopped.is_set():
+                if not select.select([fd], [], [], 0.5)[0]:
+                    continue
+                # Collect the whole burst (one atomic save alone is several events), then re-stat once
+                names = set()
+                overflow = False
+                deadline = time.monotonic() + self.debounce
+                while True:
+                    overflow |= self.read_events(fd, names)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                        break
+                if overflow:
+                    self.report(self.take_snapshot())
+                    continue
+                current = dict(self.snapshot)
+                for name in names:
+                    info = self.stat(name)
+                    if info is None:
+                        current.pop(name, None)
+                    else:
+                        current[name] = info
+                self.report(current)
+        finally:
+            os.close(fd)
+
+
+class SQLiteStorage:
+    """
+    Notes stored in a single SQLite database in WAL mode, with an FTS5 table kept in sync by
+    triggers for full-text search.
+    """
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(database_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS notes (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+                    content TEXT NOT NULL,
+                    formatting TEXT,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                    content, content='notes', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+                    INSERT INTO notes_fts (rowid, content) VALUES (new.id, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+                    INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE OF content ON notes BEGIN
+                    INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    INSERT INTO notes_fts (rowid, content) VALUES (new.id, new.content);
+                END;
+            """)
+
+    def scan(self, batch_size=500):
+        """Yield lists of NoteEntry, batch_size entries at a time."""
+        with self.lock:
+            rows = self.connection.execute("SELECT name, mtime, size FROM notes").fetchall()
+        for start in range(0, len(rows), batch_size):
+            yield [NoteEntry(*row) for row in rows[start:start + batch_size]]
+
+    def change_token(self):
+        """A value that changes whenever another connection modifies the database."""
+        with self.lock:
+            return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _fetch(self, column, name):
+        with self.lock:
+            row = self.connection.execute(f"SELECT {column} FROM notes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No note named '{name}'")
+        return row[0]
+
+    def entry(self, name):
+        """NoteEntry with the note's current mtime and size; raises FileNotFoundError if missing."""
+        return NoteEntry(name, self._fetch("mtime", name), self._fetch("size", name))
+
+    def size(self, name):
+        return self._fetch("size", name)
+
+    def open(self, name):
+        """Open a note for streaming reads."""
+        return io.StringIO(self.read(name))
+
+    def read(self, name):
+        return self._fetch("content", name)
+
+    def read_formatting(self, name):
+        """Return the note's encoded formatting, or None if it has none."""
+        return self._fetch("formatting", name)
+
+    def _upsert(self, name, content, formatting):
+        self.connection.execute(
+            """INSERT INTO notes (name, content, formatting, mtime, size) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (name) DO UPDATE SET content = excluded.content, formatting = excluded.formatting,
+                   mtime = excluded.mtime, size = excluded.size""",
+            (name, content, formatting, time.time(), len(content.encode('utf-8')))
+        )
+
+    def write(self, name, content, formatting=None):
+        with self.lock, self.connection:
+            self._upsert(name, content, formatting)
+
+    def write_many(self, notes, batch_size=500):
+        """
+        Write (name, content, formatting) tuples, one transaction per batch_size notes so other
+        readers and writers get the lock in between; returns how many were written.
+        """
+        count = 0
+        notes = iter(notes)
+        while True:
+            # Pull the batch before taking the lock: the notes may be read from a slow source
+            batch = list(itertools.islice(notes, batch_size))
+            if not batch:
+                return count
+            with self.lock, self.connection:
+                for name, content, formatting in batch:
+                    self._upsert(name, content, formatting)
+            count += len(batch)
+
+    def remove(self, name):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM notes WHERE name = ?", (name,))
+
+    def refresh_index(self):
+        """The FTS table is maintained by triggers, so there is nothing to refresh."""
+
+    def search(self, query, limit=500):
+        """Return (name, hits, first_offset) tuples for notes containing every query term."""
+        terms = list(dict.fromkeys(NoteIndex.TOKEN_PATTERN.findall(query.lower())))
+        if not terms:
+            return []
+        # Quote each term so user input is never parsed as FTS5 query syntax
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        with self.lock:
+            # Rank with FTS5 first; hits and first offset are then worked out for the returned notes only
+            rows = self.connection.execute(
+                """SELECT notes.name, notes.content
+                   FROM (SELECT rowid, bm25(notes_fts) AS rank FROM notes_fts
+                         WHERE notes_fts MATCH ? ORDER BY rank LIMIT ?) AS ranked
+                   JOIN notes ON notes.id = ranked.rowid
+                   ORDER BY ranked.rank""",
+                (match, limit)
+            ).fetchall()
+        # Whole terms only, like NoteIndex's tokens; offsets are found in the original text,
+        # since lower() can change a note's length
+        patterns = [re.compile(r"(?<!\w)" + re.escape(term) + r"(?!\w)", re.IGNORECASE) for term in terms]
+        results = []
+        for name, content in rows:
+            hits = 0
+            first = None
+            for pattern in patterns:
+                offsets = [found.start() for found in pattern.finditer(content)]
+                if offsets:
+                    hits += len(offsets)
+                    first = offsets[0] if first is None else min(first, offsets[0])
+            results.append((name, hits, first or 0))
+        return results
+
+
+def copy_notes(source, destination, progress=None):
+    """
+    Stream every note (with its formatting) from one storage into another, e.g. to import the
+    Notes folder into SQLite in batched transactions. progress(count) is called as notes are copied.
+    Returns the number of notes copied.
+    """
+    def notes():
+        count = 0
+        for batch in source.scan():
+            for entry in batch:
+                yield entry.name, source.read(entry.name), source.read_formatting(entry.name)
+                count += 1
+                if progress:
+                    progress(count)
+
+    return destination.write_many(notes())
+
+
+# Bulk export/import formats, chosen from the bundle's file extension
+BUNDLE_FORMATS = {".jsonl": "jsonl", ".md": "markdown", ".zip": "zip"}
+MARKDOWN_BUNDLE_HEADER = "# Notes\n\n"
+MARKDOWN_NOTE_MARKER = "<!-- note "
+
+
+def bundle_format(path):
+    """Return the bundle format for a path's extension; raises ValueError for unknown ones."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in BUNDLE_FORMATS:
+        raise ValueError(f"Unknown bundle type '{extension}', expected one of {', '.join(BUNDLE_FORMATS)}")
+    return BUNDLE_FORMATS[extension]
+
+
+def iter_notes(storage):
+    """Yield (name, content, formatting, mtime) for every note in a storage, one note at a time."""
+    for batch in storage.scan():
+        for entry in batch:
+            yield entry.name, storage.read(entry.name), storage.read_formatting(entry.name), entry.mtime
+
+
+def export_notes(storage, path, progress=None):
+    """
+    Stream every note in a storage into a JSONL, Markdown or zip bundle, holding one note in
+    memory at a time. The bundle is written next to path and renamed into place when complete.
+    progress(count) is called as notes are written. Returns the number of notes exported.
+    """
+    writer = {"jsonl": _write_jsonl, "markdown": _write_markdown, "zip": _write_zip}[bundle_format(path)]
+    count = 0
+
+    def notes():
+        nonlocal count
+        for note in iter_notes(storage):
+            yield note
+            count += 1
+            if progress:
+                progress(count)
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".", suffix=".tmp")
+    os.close(fd)
+    try:
+        writer(temp_path, notes())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return count
+
+
+def _write_jsonl(path, notes):
+    with open(path, "w", encoding='utf-8') as file:
+        for name, content, formatting, mtime in notes:
+            record = {"name": name, "mtime": mtime, "content": content, "formatting": formatting}
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _write_markdown(path, notes):
+    # Each note is a metadata comment (with its line count, so note text that looks like a
+    # marker is never mistaken for one), a heading, then the text verbatim
+    with open(path, "w", encoding='utf-8', newline="\n") as file:
+        file.write(MARKDOWN_BUNDLE_HEADER)
+        for name, content, formatting, mtime in notes:
+            metadata = {"name": name, "mtime": mtime, "lines": content.count("\n") + 1, "formatting": formatting}
+            # "-->" can only occur inside JSON strings, where > is an equivalent escape
+            header = json.dumps(metadata, ensure_ascii=False).replace("-->", "--\\u003e")
+            file.write(f"{MARKDOWN_NOTE_MARKER}{header} -->\n## {name}\n\n{content}\n\n")
+
+
+def _write_zip(path, notes):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content, formatting, mtime in notes:
+            date_time = time.localtime(max(mtime, 315532800))[:6]  # zip dates start in 1980
+            for member, data in ((name, content), (name + FORMAT_SUFFIX, formatting)):
+                if data is None:
+                    continue
+                info = zipfile.ZipInfo(member, date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(info, "w") as entry:
+                    entry.write(data.encode('utf-8'))
+
+
+def read_bundle(path, on_skip=None):
+    """
+    Yield (name, content, formatting) for each note in a JSONL, Markdown or zip bundle, one
+    note at a time. Entries whose name is not a plain .txt file name are skipped, calling
+    on_skip(name) for each.
+    """
+    reader = {"jsonl": _read_jsonl, "markdown": _read_markdown, "zip": _read_zip}[bundle_format(path)]
+    for name, content, formatting in reader(path):
+        if (not isinstance(name, str) or os.path.basename(name) != name
+                or not name.lower().endswith(".txt") or name.lower() == ".txt"):
+            if on_skip:
+                on_skip(name)
+            continue
+        yield name, content, formatting
+
+
+def _read_jsonl(path):
+    with open(path, "r", encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield record["name"], record["content"], record.get("formatting")
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}, line {line_number}: not a note record ({e})") from None
+
+
+def _read_markdown(path):
+    with open(path, "r", encoding='utf-8', newline="\n") as file:
+        for line in file:
+            if not line.startswith(MARKDOWN_NOTE_MARKER):
+                continue
+            try:
+                metadata = json.loads(line.rstrip()[len(MARKDOWN_NOTE_MARKER):-len("-->")])
+                file.readline()  # "## name"
+                file.readline()  # Blank line after the heading
+                lines = [file.readline() for _ in range(metadata["lines"])]
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}: malformed note header ({e})") from None
+            yield metadata["name"], "".join(lines)[:-1], metadata.get("formatting")
+
+
+def _read_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        members = set(archive.namelist())
+        for member in archive.namelist():
+            if member.endswith("/") or member.endswith(FORMAT_SUFFIX):
+                continue
+            formatting = None
+            if member + FORMAT_SUFFIX in members:
+                formatting = archive.read(member + FORMAT_SUFFIX).decode('utf-8')
+            # Zips made by other tools keep notes in folders; the note name is the file name
+            name = member.replace("\\", "/").rsplit("/", 1)[-1]
+            yield name, archive.read(member).decode('utf-8'), formatting
+
+
+def import_notes(storage, path, progress=None):
+    """
+    Stream the notes of a bundle into a storage, overwriting notes with the same name.
+    progress(count) is called as notes are written. Returns (notes imported, entries skipped
+    for not being a plain .txt file name).
+    """
+    skipped = []
+
+    def notes():
+        count = 0
+        for note in read_bundle(path, skipped.append):
+            yield note
+            count += 1
+            if progress:
+                progress(count)
+
+    return storage.write_many(notes()), len(skipped)
+
+
+GREP_COUNT_CHUNK = 1024 * 1024  # Bytes copied at a time when counting lines between matches
+
+
+def grep_file(path, pattern, flags=re.IGNORECASE, max_matches=1000, snippet_length=160):
+    """
+    Search one file for a bytes regex through mmap, so the file is never read into memory as a
+    whole. Returns [(line_number, snippet), ...], one entry per matching line. The pattern is
+    matched against the UTF-8 bytes, so IGNORECASE and \\w only cover ASCII.
+    """
+    matches = []
+    regex = re.compile(pattern, flags)
+    try:
+        with open(path, "rb") as file:
+            if not os.fstat(file.fileno()).st_size:
+                return matches
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                line_number = 1
+                counted = 0
+                line_end = -1
+                for match in regex.finditer(mapped):
+                    start = match.start()
+                    if start <= line_end:
+                        continue  # Another match on a line already reported
+                    # Count in bounded slices so a match far into a huge file copies little at a time
+                    for position in range(counted, start, GREP_COUNT_CHUNK):
+                        line_number += mapped[position:min(start, position + GREP_COUNT_CHUNK)].count(b"\n")
+                    counted = start
+                    line_start = mapped.rfind(b"\n", 0, start) + 1
+                    line_end = mapped.find(b"\n", start)
+                    if line_end < 0:
+                        line_end = len(mapped)
+                    snippet = mapped[line_start:min(line_end, line_start + snippet_length)]
+                    matches.append((line_number, snippet.decode("utf-8", "replace").strip()))
+                    if len(matches) >= max_matches:
+                        break
+    except OSError:
+        pass  # Removed or unreadable since the directory was listed
+    return matches
+
+
+def grep_files(directory, names, pattern, flags=re.IGNORECASE):
+    """Run grep_file over a batch of notes; returns [(name, matches)] for the notes that match."""
+    results = []
+    for name in names:
+        matches = grep_file(os.path.join(directory, name), pattern, flags)
+        if matches:
+            results.append((name, matches))
+    return results
+
+
+class ParallelGrep:
+    """
+    Regex search over every note in a directory, spread across a process pool in batches of
+    roughly BATCH_BYTES. on_batch(results, files_searched) is called from the run() thread as
+    each batch finishes; cancel() stops handing out batches and drops the queued ones.
+    """
+
+    BATCH_BYTES = 32 * 1024 * 1024
+    BATCH_FILES = 256
+
+    def __init__(self, directory, pattern, flags=re.IGNORECASE, on_batch=None, workers=None):
+        self.directory = directory
+        self.pattern = pattern
+        self.flags = flags
+        self.on_batch = on_batch
+        self.workers = workers or os.cpu_count() or 1
+        self.cancelled = threading.Event()
+        self.files_searched = 0
+
+    def batches(self):
+        batch = []
+        batch_bytes = 0
+        for entries in scan_notes(self.directory):
+            for entry in entries:
+                batch.append(entry.name)
+                batch_bytes += entry.size
+                if batch_bytes >= self.BATCH_BYTES or len(batch) >= self.BATCH_FILES:
+                    yield batch
+                    batch = []
+                    batch_bytes = 0
+        if batch:
+            yield batch
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        """Search all notes; returns True if the search ran to completion."""
+        # Forking a threaded Tk process can deadlock the children; start workers from a clean
+        # server process where the platform has one (Windows and macOS already spawn)
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        else:
+            context = None
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            pending = {}
+            batches = self.batches()
+            while not self.cancelled.is_set():
+                # Keep a few batches per worker in flight rather than queueing the whole folder
+                for names in batches:
+                    pending[executor.submit(grep_files, self.directory, names, self.pattern, self.flags)] = len(names)
+                    if len(pending) >= self.workers * 2:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.files_searched += pending.pop(future)
+                    results = future.result()
+                    if self.on_batch and not self.cancelled.is_set():
+                        self.on_batch(results, self.files_searched)
+            for future in pending:
+                future.cancel()
+        return not self.cancelled.is_set()
+
+
+class MappedNote:
+    """
+    Read-only access to a note file of any size through mmap. Lines are found by scanning
+    for newlines from the nearest checkpoint of a sparse (line number, offset) index with one
+    entry per INDEX_STEP bytes, which build_index() fills in from a background thread, so
+    memory stays flat however large the file is. Offsets are in bytes.
+    """
+
+    INDEX_STEP = 64 * 1024
+    COUNT_CHUNK = 1024 * 1024  # Bytes copied at a time when counting newlines
+    SEARCH_WINDOW = 1024 * 1024  # Bytes scanned per round of a search, between cancel checks
+    MAX_MATCH = 4096  # Longest match a search finds across a window boundary
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # An empty file cannot be mapped; bytes offers the same find/rfind/slicing
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        # Checkpoints: line checkpoint_lines[i] starts at checkpoint_offsets[i]. Lines are
+        # appended before offsets so readers can size their view on the offsets.
+        self.checkpoint_lines = array("q", [0])
+        self.checkpoint_offsets = array("q", [0])
+        self.indexed_bytes = 0
+        self.line_count = None  # Set once the index is complete
+        self.cancelled = threading.Event()
+
+    def build_index(self, progress=None):
+        """
+        Scan the whole file for line starts, recording a checkpoint every INDEX_STEP bytes.
+        progress(indexed_bytes) is called after each checkpoint. Returns False if cancelled.
+        """
+        line = 0
+        position = 0
+        try:
+            while position < self.size:
+                if self.cancelled.is_set():
+                    return False
+                end = min(self.size, position + self.INDEX_STEP)
+                line += self.map[position:end].count(b"\n")
+                if end == self.size:
+                    break
+                if self.map[end - 1] != 10:
+                    # Checkpoint at the start of the next line instead
+                    newline = self.map.find(b"\n", end)
+                    if newline < 0:
+                        break
+                    line += 1
+                    end = newline + 1
+                self.checkpoint_lines.append(line)
+                self.checkpoint_offsets.append(end)
+                self.indexed_bytes = position = end
+                if progress:
+                    progress(position)
+        except ValueError:
+            return False  # Closed while indexing
+        self.indexed_bytes = self.size
+        self.line_count = line + 1
+        return True
+
+    def count_newlines(self, start, end):
+        count = 0
+        for position in range(start, end, self.COUNT_CHUNK):
+            count += self.map[position:min(end, position + self.COUNT_CHUNK)].count(b"\n")
+        return count
+
+    def line_number(self, offset):
+        """The 0-based line containing offset, or None while the index has not reached it."""
+        if offset > self.indexed_bytes:
+            return None
+        count = len(self.checkpoint_offsets)
+        checkpoint = bisect_right(self.checkpoint_offsets, offset, 0, count) - 1
+        start = self.checkpoint_offsets[checkpoint]
+        return self.checkpoint_lines[checkpoint] + self.count_newlines(start, offset)
+
+    def line_offset(self, line):
+        """
+        Offset of the start of a 0-based line (the last line if there are fewer), or None
+        while the index has not reached it.
+        """
+        count = len(self.checkpoint_offsets)
+        checkpoint = bisect_right(self.checkpoint_lines, line, 0, count) - 1
+        if self.line_count is None and checkpoint == count - 1 and line > self.checkpoint_lines[checkpoint]:
+            return None  # Past the indexed part; walking there could mean scanning most of the file
+        offset = self.next_lines(self.checkpoint_offsets[checkpoint], line - self.checkpoint_lines[checkpoint])
+        if offset > self.indexed_bytes:
+            return None
+        return offset
+
+    def line_start(self, offset):
+        return self.map.rfind(b"\n", 0, offset) + 1
+
+    def next_lines(self, offset, count):
+        """Offset of the line count lines after the one at offset, stopping at the last line."""
+        for _ in range(count):
+            newline = self.map.find(b"\n", offset)
+            if newline < 0:
+                break
+            offset = newline + 1
+        return offset
+
+    def previous_lines(self, offset, count):
+        """Offset of the line count lines before the one containing offset, stopping at the first."""
+        offset = self.line_start(offset)
+        for _ in range(count):
+            if offset == 0:
+                break
+            offset = self.line_start(offset - 1)
+        return offset
+
+    def read_lines(self, offset, count, max_length=10000):
+        """
+        Decode up to count lines starting at offset. Lines longer than max_length bytes are cut
+        short and end in an ellipsis. Returns (lines, offset just past the last line read).
+        """
+        lines = []
+        while len(lines) < count and offset < self.size:
+            newline = self.map.find(b"\n", offset, offset + max_length + 1)
+            if newline >= 0:
+                line = self.map[offset:newline].decode("utf-8", "replace")
+                offset = newline + 1
+            else:
+                end = min(self.size, offset + max_length)
+                line = self.map[offset:end].decode("utf-8", "replace")
+                newline = self.map.find(b"\n", end)
+                offset = self.size if newline < 0 else newline + 1
+                if end < self.size:
+                    line += "…"
+            lines.append(line.rstrip("\r"))
+        return lines, offset
+
+    def search(self, regex, start, backwards=False):
+        """
+        (start, end) offsets of the first match of a compiled bytes regex at or after start,
+        or of the last one ending at or before start when backwards; None if there is none.
+        """
+        # The regex holds the GIL while it runs, so scan a window at a time and check for
+        # cancellation in between. Each window is read on for MAX_MATCH bytes, so matches that
+        # straddle its end are still found; the next window finds the ones starting there.
+        if not backwards:
+            begin = start
+            while not self.cancelled.is_set():
+                limit = begin + self.SEARCH_WINDOW
+                match = regex.search(self.map, begin, min(self.size, limit + self.MAX_MATCH))
+                if match is not None and (match.start() < limit or limit + self.MAX_MATCH >= self.size):
+                    return match.span()
+                if limit + self.MAX_MATCH >= self.size:
+                    return None
+                begin = limit
+            return None
+        limit = start
+        while limit > 0:
+            if self.cancelled.is_set():
+                return None
+            begin = max(0, limit - self.SEARCH_WINDOW)
+            last = None
+            for match in regex.finditer(self.map, begin, min(start, limit + self.MAX_MATCH)):
+                if match.start() >= limit:
+                    break
+                last = match
+            if last is not None:
+                return last.span()
+            limit = begin
+        return None
+
+    def close(self):
+        self.cancelled.set()
+        if self.size:
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # A search still holds the buffer; the map is freed with this object
+        self.file.close()
+
+
+# One stored version of a note, as listed by VersionStore.list_versions
+VersionInfo = namedtuple("VersionInfo", ["number", "timestamp", "kind", "stored_size"])
+
+
+class VersionStore:
+    """
+    Per-note version history. Each note has one append-only file of zlib-compressed records:
+    a full snapshot every `snapshot_interval` versions and line-based deltas against the
+    previous version in between, so rebuilding any version replays a bounded number of deltas.
+    """
+
+    HEADER = struct.Struct("<BdI")  # kind, timestamp, payload length
+    SNAPSHOT = 0
+    DELTA = 1
+
+    def __init__(self, directory, snapshot_interval=20, max_versions=200):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.max_versions = max_versions
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name + ".versions")
+
+    def _records(self, name):
+        """
+        Return (offset, kind, timestamp, length) for every complete record, reading only the
+        headers. A record cut short by a crash mid-append ends the list.
+        """
+        records = []
+        try:
+            with open(self.path(name), "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                while True:
+                    header = file.read(self.HEADER.size)
+                    if len(header) < self.HEADER.size:
+                        break
+                    kind, timestamp, length = self.HEADER.unpack(header)
+                    if file.tell() + length > size:
+                        break
+                    records.append((file.tell(), kind, timestamp, length))
+                    file.seek(length, os.SEEK_CUR)
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _truncate(self, name, records):
+        """Cut the history file back to the end of the last of records, dropping a bad tail."""
+        end = records[-1][0] + records[-1][3] if records else 0
+        try:
+            if os.path.getsize(self.path(name)) > end:
+                os.truncate(self.path(name), end)
+        except FileNotFoundError:
+            pass
+
+    def _latest_readable(self, name, records):
+        """
+        Return (records, content) for the longest run of records whose last version rebuilds,
+        so a bad record anywhere in the latest version's delta chain is dropped with what follows.
+        """
+        for number in range(len(records) - 1, -1, -1):
+            try:
+                return records[:number + 1], self._rebuild(name, records, number)
+            except (zlib.error, ValueError):
+                continue
+        return [], None
+
+    def _rebuild(self, name, records, number):
+        """Rebuild version `number` from the nearest snapshot at or before it."""
+        base = max(index for index in range(number + 1) if records[index][1] == self.SNAPSHOT)
+        with open(self.path(name), "rb") as file:
+            lines = None
+            for offset, kind, timestamp, length in records[base:number + 1]:
+                file.seek(offset)
+                payload = zlib.decompress(file.read(length)).decode('utf-8')
+                if kind == self.SNAPSHOT:
+                    lines = payload.splitlines(keepends=True)
+                else:
+                    lines = self.apply_delta(lines, json.loads(payload))
+        return "".join(lines)
+
+    @staticmethod
+    def make_delta(old_lines, new_lines):
+        """Encode new_lines as copies of old line ranges plus inserted text."""
+        operations = []
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if tag == "equal":
+                operations.append([old_start, old_end])
+            elif new_end > new_start:
+                operations.append("".join(new_lines[new_start:new_end]))
+        return operations
+
+    @staticmethod
+    def apply_delta(old_lines, operations):
+        lines = []
+        for operation in operations:
+            if isinstance(operation, str):
+                lines.extend(operation.splitlines(keepends=True))
+            else:
+                lines.extend(old_lines[operation[0]:operation[1]])
+        return lines
+
+    def _encode(self, kind, payload, timestamp):
+        data = zlib.compress(payload.encode('utf-8'), 6)
+        return self.HEADER.pack(kind, timestamp, len(data)) + data
+
+    def _append(self, name, records, content, previous, timestamp):
+        """Encode content as a snapshot or a delta against `previous`, whichever the schedule and size call for."""
+        snapshot = self._encode(self.SNAPSHOT, content, timestamp)
+        if previous is not None and len(records) % self.snapshot_interval != 0:
+            delta = self._encode(self.DELTA, json.dumps(self.make_delta(
+                previous.splitlines(keepends=True), content.splitlines(keepends=True)), separators=(",", ":")),
+                timestamp)
+            if len(delta) < len(snapshot):
+                return delta
+        return snapshot
+
+    def record(self, name, content, timestamp=None):
+        """Append a new version of a note unless it matches the latest one. Returns True if recorded."""
+        with self.lock:
+            # Cut back to the last version that rebuilds, e.g. after a torn append
+            records, previous = self._latest_readable(name, self._records(name))
+            self._truncate(name, records)
+            if content == previous:
+                return False
+            record = self._append(name, records, content, previous, timestamp or time.time())
+            with open(self.path(name), "ab") as file:
+                file.write(record)
+                file.flush()
+                os.fsync(file.fileno())
+            if len(records) + 1 > self.max_versions:
+                # Prune to three quarters so the rewrite is not repeated on every save
+                self._collect(name, self.max_versions * 3 // 4)
+            return True
+
+    def list_versions(self, name):
+        """Return VersionInfo for every stored version, oldest first."""
+        with self.lock:
+            return [VersionInfo(number, timestamp, "snapshot" if kind == self.SNAPSHOT else "delta", length)
+                    for number, (offset, kind, timestamp, length) in enumerate(self._records(name))]
+
+    def get(self, name, number):
+        """Return the content of a stored version."""
+        with self.lock:
+            return self._rebuild(name, self._records(name), number)
+
+    def _collect(self, name, keep, max_age_days=None):
+        """Rewrite a note's history keeping at most the `keep` newest versions (and none older than max_age_days)."""
+        records = self._records(name)
+        first = max(0, len(records) - keep)
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            while first < len(records) - 1 and records[first][2] < cutoff:
+                first += 1
+        if first == 0:
+            return 0
+
+        temp_path = self.path(name) + ".tmp"
+        previous = None
+        kept = []
+        with open(temp_path, "wb") as file:
+            for number in range(first, len(records)):
+                try:
+                    content = self._rebuild(name, records, number)
+                except (zlib.error, ValueError):
+                    continue  # Unreadable version: skip it, the next is encoded against the last one kept
+                record = self._append(name, kept, content, previous, records[number][2])
+                file.write(record)
+                kept.append(number)
+                previous = content
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path(name))
+        return first
+
+    def collect_garbage(self, keep=None, max_age_days=None):
+        """Prune every note's history; returns the number of versions removed."""
+        removed = 0
+        with self.lock:
+            for entry in os.listdir(self.directory):
+                if entry.endswith(".versions"):
+                    removed += self._collect(entry[:-len(".versions")], keep or self.max_versions, max_age_days)
+        return removed
+
+
+class Histogram:
+    """
+    Log2 histogram of durations: bucket n counts values in [2**(n-1), 2**n) microseconds, so
+    memory stays constant however long the app runs and percentiles are accurate to 2x.
+    """
+
+    BUCKETS = 32
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * self.BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[min(int(seconds * 1_000_000).bit_length(), self.BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound, in milliseconds, of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= wanted:
+                return min((1 << bucket) / 1000, self.max * 1000)
+        return self.max * 1000
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max * 1000,
+            "buckets": list(self.buckets),
+        }
+
+
+class Instrumentation:
+    """
+    Opt-in timing of hot paths into per-operation histograms. While disabled, a timed call
+    costs one attribute check on top of the call itself.
+    """
+
+    COLUMNS = ["operation", "count", "total_ms", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def timed(self, name):
+        """Decorator recording the wall time of each call under name when enabled."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - started)
+            return wrapper
+        return decorate
+
+    def record(self, name, seconds):
+        """Add one duration sample; safe to call from worker threads."""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def snapshot(self):
+        """List of per-operation summaries, slowest total first."""
+        with self.lock:
+            rows = [dict(operation=name, **histogram.summary()) for name, histogram in self.histograms.items()]
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def export(self, path):
+        """Write the current summaries to path, as CSV if it ends in .csv and JSON otherwise."""
+        rows = self.snapshot()
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=self.COLUMNS, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, "w", encoding='utf-8') as file:
+                json.dump({"exported_at": time.time(), "operations": rows}, file, indent=2)